@@ -0,0 +1,49 @@
+# import_time.py - measures how long a fresh process takes to `import ks`.
+# Compares a cold start with caching disabled (the behavior before parse tables and the prelude were cached)
+# against a start where the caches have already been populated.
+# usage:
+#     python benchmarks/import_time.py [number of runs]
+
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+top_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(env):
+    start = time.time()
+    subprocess.check_call([sys.executable, "-c", "import ks"], cwd=top_dir, env=env)
+    return time.time() - start
+
+
+def measure(label, env, runs):
+    times = sorted(time_import(env) for _ in range(runs))
+    print("{:<24} min {:7.1f} ms   median {:7.1f} ms".format(label, times[0] * 1000, times[len(times) // 2] * 1000))
+    return times[len(times) // 2]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    cache_dir = tempfile.mkdtemp()
+    try:
+        uncached = dict(os.environ, KS_NO_CACHE="1")
+        cached = dict(os.environ, KS_CACHE_DIR=cache_dir)
+        cached.pop("KS_NO_CACHE", None)
+
+        before = measure("no cache", uncached, runs)
+        # the first cached run populates the cache directory.
+        time_import(cached)
+        after = measure("warm cache", cached, runs)
+        print("speedup: {:.1f}x".format(before / after))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
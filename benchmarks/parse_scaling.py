@@ -0,0 +1,50 @@
+# parse_scaling.py - shows how LR parsing time grows with the number of input tokens.
+# The time per token should stay roughly constant from the smallest input to the largest.
+# usage:
+#     python benchmarks/parse_scaling.py [largest token count]
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+top_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, top_dir)
+
+from ks.parser.ast import get_compiler, slurp
+from ks.parser.lex import Scanner
+from ks.parser.util import get_parser
+
+tokens_filename = os.path.join(top_dir, "ks", "tokens.txt")
+rules_filename = os.path.join(top_dir, "ks", "language.txt")
+
+
+# returns the tokens of one short statement.
+def statement_tokens():
+    # get_compiler assigns the parser's symbol ids to the token rules, so tokens lexed afterwards carry them.
+    compiler = get_compiler(tokens_filename, rules_filename)
+    tokens = Scanner(list(compiler.token_rules.values())).lex("x = y + 1;")
+    return [token for token in tokens if token.klass.name != "whitespace"]
+
+
+def main():
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    statement = statement_tokens()
+    # the same parser that get_compiler used, since parsers are memoized by grammar.
+    parser = get_parser(slurp(rules_filename))
+
+    size = 1000
+    while size <= largest:
+        count = size // len(statement)
+        # a generator, so the benchmark doesn't also measure building a huge list.
+        tokens = (token for _ in range(count) for token in statement)
+        start = time.time()
+        parser.parse(tokens)
+        elapsed = time.time() - start
+        print("{:>9} tokens  {:8.3f} s  {:6.2f} us/token".format(count * len(statement), elapsed, elapsed * 10**6 / (count * len(statement))))
+        size *= 10
+
+
+if __name__ == "__main__":
+    main()
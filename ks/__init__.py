@@ -8,22 +8,32 @@ except ImportError:
 import os
 import sys
 
-from ks.eval_ast import NodeConstructor, evaluate
+from ks import eval_closure, eval_vm, optimizer, snapshot
+from ks.eval_ast import NodeConstructor, evaluate, evaluate_program
 from ks.parser import ast, parserExceptions
 
 cur_dir = os.path.dirname(os.path.abspath(__file__))
 top_dir = os.path.dirname(cur_dir)
 
+#the available execution engines, keyed by the name passed to `execute`.
+#each one is a function that takes the root node of a program and runs it.
+engines = {
+    "tree": evaluate_program,
+    "closure": eval_closure.evaluate,
+    "vm": eval_vm.evaluate,
+}
+
 reducible_nodes = ["StatementList", "ExpressionList", "IdentifierList", "KeyValueList", "FunctionDeclarationStatementList"]
 
 base_compile = ast.get_compiler(
     os.path.join(cur_dir, "tokens.txt"),
     os.path.join(cur_dir, "language.txt"),
-    reducible_nodes
+    reducible_nodes,
+    single_pass=True
 )
 
 
-def compile(program_text, strict=False):
+def compile_uncached(program_text, strict=False):
     try:
         tree = base_compile(program_text)
     except parserExceptions.NoActionFoundError as ex:
@@ -36,9 +46,43 @@ def compile(program_text, strict=False):
     return tree
 
 
-def execute(program_text, strict=False, mode="exec"):
+#identifies a program's compiled tree. Changes whenever the program text, the grammar, or the snapshot format changes.
+def cache_key(program_text, strict=False):
+    return snapshot.source_key(program_text, base_compile.key + (" strict" if strict else ""))
+
+
+def compile(program_text, strict=False, cache=False):
+    """
+    returns the syntax tree of the given program.
+    arguments:
+        strict - if False, a program missing its final semicolon is accepted anyway.
+        cache - if True, reuse the tree compiled by an earlier run of the same program, if there is one,
+            and save the tree for later runs otherwise. See snapshot.py.
+            Off by default, since nothing removes old snapshots; a REPL or a host that runs many generated programs would fill the cache directory.
+            Source files run by `main`, and the prelude, are cached.
+    """
+    if not cache:
+        return compile_uncached(program_text, strict)
+    key = cache_key(program_text, strict)
+    tree = snapshot.load(key, base_compile.token_rules)
+    if tree is None:
+        tree = compile_uncached(program_text, strict)
+        snapshot.save(key, tree)
+    return tree
+
+
+def execute(program_text, strict=False, mode="exec", cache=False, engine="tree", optimize=True):
+    """
+    compiles and runs the given program.
+    arguments:
+        strict, cache - see `compile`.
+        mode - "exec" to run a program, or "single" to also print the value of a final expression statement, as the REPL does.
+        engine - the name of the execution engine to use. See `engines`.
+        optimize - if True, run the tree through optimizer.py before executing it.
+    """
     assert mode in ["exec", "single"], "did not recognize execution mode '{}'".format(mode)
-    tree = compile(program_text, strict)
+    assert engine in engines, "did not recognize execution engine '{}'".format(engine)
+    tree = compile(program_text, strict, cache)
     if mode == "single":
         #primarily used by the REPL. if the final statement in the program is an expression that doesn't evaluate to None, print its result.
         #print "entering pdb..."
@@ -47,7 +91,9 @@ def execute(program_text, strict=False, mode="exec"):
         last_statement = tree.children[-1].children[0]
         if last_statement.klass == "ExpressionStatement":
             last_statement.children[0] = NodeConstructor.make_identifier_call("print_single", [last_statement.children[0]])
-    evaluate(tree)
+    if optimize:
+        tree = optimizer.optimize(tree)
+    engines[engine](tree)
 
 
 def check_output(*args, **kargs):
@@ -93,7 +139,7 @@ def repl():
         data += line
         try:
             #if user entered an empty line, he's done with his statement even if he didn't end with a semicolon.
-            execute(data, strict=bool(line), mode="single")
+            execute(data, strict=bool(line), mode="single", cache=False)
         except Exception as ex:
             if isEofException(ex):
                 print("...", end = " ")
@@ -104,8 +150,27 @@ def repl():
         print(">>>", end = " ")
 
 
-with open(os.path.join(cur_dir, "native_builtin_initialization.k")) as file:
-    execute(file.read())
+prelude_filename = os.path.join(cur_dir, "native_builtin_initialization.k")
+
+
+def compile_prelude(rebuild=False):
+    """
+    returns the syntax tree of the native builtin initialization script.
+    The tree is loaded from a snapshot when one exists for the current prelude and grammar;
+    otherwise it is compiled from source and a new snapshot is saved.
+    arguments:
+        rebuild - if True, ignore any existing snapshot.
+    """
+    with open(prelude_filename) as file:
+        program_text = file.read()
+    if rebuild:
+        tree = compile_uncached(program_text)
+        snapshot.save(cache_key(program_text), tree)
+        return tree
+    return compile(program_text, cache=True)
+
+
+evaluate_program(optimizer.optimize(compile_prelude()))
 
 
 def main(*argv):
@@ -116,7 +181,13 @@ def main(*argv):
         repl()
         sys.exit(0)
 
-    with open(sys.argv[1]) as file:
+    with open(argv[1]) as file:
         program_text = file.read()
 
-    execute(program_text, "--strict" in sys.argv[2:])
+    flags = argv[2:]
+    engine = "tree"
+    for flag in flags:
+        if flag.startswith("--engine="):
+            engine = flag.partition("=")[2]
+
+    execute(program_text, "--strict" in flags, cache="--no-cache" not in flags, engine=engine)
@@ -0,0 +1,24 @@
+# build.py - precomputes everything that `import ks` would otherwise have to construct from scratch.
+# Run it once after installing or after editing the grammar or the prelude:
+#     python -m ks.build
+
+from __future__ import print_function
+
+import ks
+from ks.parser import tablecache
+
+
+def build():
+    cache_dir = tablecache.get_cache_dir()
+    if cache_dir is None:
+        print("caching is disabled (KS_NO_CACHE is set); nothing to build.")
+        return False
+    # importing ks has already loaded or regenerated the parse tables.
+    # rebuild the prelude unconditionally so a stale or corrupt snapshot gets replaced.
+    ks.compile_prelude(rebuild=True)
+    print("wrote parse tables and prelude snapshot to {}".format(cache_dir))
+    return True
+
+
+if __name__ == "__main__":
+    build()
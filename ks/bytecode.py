@@ -0,0 +1,295 @@
+#bytecode.py - compiles the AST into bytecode for the virtual machine in eval_vm.py.
+#Each instruction is two ints, an opcode and an argument, stored consecutively in an array.
+#Arguments index into the code object's `constants` or `names` pools, or give a jump target.
+
+from array import array
+
+from ks import resolver
+from ks.eval_ast import NodeConstructor, OperatorSite, line, object_factory
+from ks.parser import ast
+
+opnames = """
+    LOAD_CONST LOAD_NONE LOAD_NAME STORE_NAME LOAD_ATTR STORE_ATTR LOAD_METHOD
+    POP JUMP POP_JUMP_IF_FALSE JUMP_IF_FALSE_NO_POP JUMP_IF_TRUE_NO_POP JUMP_IF_OPERATORS_CHANGED
+    CALL CALL_METHOD RETURN YIELD_VALUE
+    UNARY_OP BINARY_OP
+    BUILD_LIST BUILD_DICT MAKE_FUNCTION
+    GET_ITER FOR_ITER
+    COMP_START COMP_NEXT COMP_APPEND GEN_COMP
+""".split()
+
+#define a module-level constant for each opcode, ex. `LOAD_CONST = 0`
+for opcode, opname in enumerate(opnames):
+    globals()[opname] = opcode
+
+#node classes that just pass their single child forward.
+pass_through_nodes = set("Expression Value Enclosure Literal Atom Primary".split())
+
+binary_operator_nodes = set("AddExpression CompExpression MultExpression BinOpExpression".split())
+
+
+class Code:
+    """
+    A compiled function body, or a compiled program.
+    attributes:
+        ops - an array of ints. Even indices hold opcodes, odd indices hold their arguments.
+        constants - KS Integers and Strings for literals, and Code objects for nested functions.
+        names - identifier and attribute names used by the code.
+        operator_sites - an OperatorSite for each BINARY_OP instruction, which indexes into this list.
+        arguments - the names of the function's arguments. Empty for programs.
+        body - the StatementList node the code was compiled from, or the expression of a generator comprehension.
+        is_generator - True if the code is the body of a generator function. Calling it creates a Generator instead of running it.
+        call_nodes - the node that each CALL and CALL_METHOD instruction was compiled from, keyed by instruction index. Used for error messages.
+    """
+    def __init__(self, body, arguments=None, is_generator=False):
+        self.ops = array("i")
+        self.constants = []
+        self.names = []
+        self.operator_sites = []
+        self.arguments = arguments if arguments is not None else []
+        self.body = body
+        self.is_generator = is_generator
+        self.call_nodes = {}
+
+    def line(self, pc):
+        return line(self.call_nodes[pc])
+
+    def __repr__(self):
+        lines = []
+        for pc in range(0, len(self.ops), 2):
+            opname, arg = opnames[self.ops[pc]], self.ops[pc+1]
+            if opname in ("LOAD_CONST", "MAKE_FUNCTION", "GEN_COMP"):
+                detail = " ({})".format(repr(self.constants[arg].value) if opname == "LOAD_CONST" else "<code>")
+            elif opname in ("LOAD_NAME", "STORE_NAME", "LOAD_ATTR", "STORE_ATTR", "LOAD_METHOD", "UNARY_OP", "COMP_START"):
+                detail = " ({})".format(self.names[arg])
+            elif opname == "BINARY_OP":
+                detail = " ({})".format(self.operator_sites[arg].name)
+            else:
+                detail = ""
+            lines.append("{:>4} {} {}{}".format(pc, opname, arg, detail))
+        return "\n".join(lines)
+
+
+class Compiler:
+    def __init__(self, body, arguments=None, is_generator=False):
+        self.code = Code(body, arguments, is_generator)
+        self.constant_ids = {}
+        self.name_ids = {}
+
+    def emit(self, opcode, arg=0):
+        self.code.ops.append(opcode)
+        self.code.ops.append(arg)
+        return len(self.code.ops) - 2
+
+    #returns the index of the next instruction to be emitted. Used as a jump target.
+    def here(self):
+        return len(self.code.ops)
+
+    #sets the target of an already emitted jump instruction.
+    def patch(self, pc, target):
+        self.code.ops[pc+1] = target
+
+    #adds a constant to the pool. ints and strs are converted to KS objects here, so LOAD_CONST doesn't need to do it every time it runs.
+    def constant(self, value):
+        #ints and strs that are equal share a slot. 1 and "1" must not, so the type is part of the key.
+        key = (type(value), value) if isinstance(value, (int, str)) else id(value)
+        if key not in self.constant_ids:
+            self.constant_ids[key] = len(self.code.constants)
+            self.code.constants.append(object_factory.make(value) if isinstance(value, (int, str)) else value)
+        return self.constant_ids[key]
+
+    def name(self, name):
+        if name not in self.name_ids:
+            self.name_ids[name] = len(self.code.names)
+            self.code.names.append(name)
+        return self.name_ids[name]
+
+    def compile_body(self):
+        self.statement(self.code.body)
+        self.emit(LOAD_NONE)
+        self.emit(RETURN)
+        return self.code
+
+    #compiles the expression of a generator comprehension. The code returns the expression's value for one item.
+    def compile_expression_body(self):
+        self.expression(self.code.body)
+        self.emit(RETURN)
+        return self.code
+
+    def statement(self, node):
+        klass = node.klass
+        if klass in ("Statement", "StatementList"):
+            for child in node.children:
+                self.statement(child)
+        elif klass == "AssignmentStatement":
+            lhs, expression_node = node.children
+            # identifier assignment
+            if isinstance(lhs, ast.Leaf):
+                self.expression(expression_node)
+                self.emit(STORE_NAME, self.name(lhs.token.value))
+            # attribute assignment
+            elif lhs.klass == "AttributeRef":
+                self.expression(lhs.children[0])
+                self.expression(expression_node)
+                self.emit(STORE_ATTR, self.name(lhs.children[1].token.value))
+            #subscript assignment
+            else:
+                self.expression(NodeConstructor.make_method_call_expression_node(lhs.children[0], "__setitem__", [lhs.children[1], expression_node]))
+                self.emit(POP)
+        elif klass == "ReturnStatement":
+            self.expression(node.children[0])
+            self.emit(RETURN)
+        elif klass == "YieldStatement":
+            if not self.code.is_generator:
+                raise Exception("`yield` outside of a function, at {}".format(line(node)))
+            self.expression(node.children[0])
+            self.emit(YIELD_VALUE)
+        elif klass == "WhileStatement":
+            start = self.here()
+            self.expression(node.children[0])
+            exit_jump = self.emit(POP_JUMP_IF_FALSE)
+            self.statement(node.children[1])
+            self.emit(JUMP, start)
+            self.patch(exit_jump, self.here())
+        elif klass == "ForStatement":
+            self.expression(node.children[1])
+            self.emit(GET_ITER)
+            start = self.emit(FOR_ITER)
+            self.emit(STORE_NAME, self.name(node.children[0].token.value))
+            self.statement(node.children[2])
+            self.emit(JUMP, start)
+            self.patch(start, self.here())
+        elif klass == "IfStatement":
+            self.expression(node.children[0])
+            else_jump = self.emit(POP_JUMP_IF_FALSE)
+            self.statement(node.children[1])
+            if len(node.children) > 2:
+                end_jump = self.emit(JUMP)
+                self.patch(else_jump, self.here())
+                self.statement(node.children[2])
+                self.patch(end_jump, self.here())
+            else:
+                self.patch(else_jump, self.here())
+        elif klass == "FunctionDeclarationStatement":
+            func = ast.Node("FunctionDeclaration", node.children[1:])
+            self.statement(ast.Node("AssignmentStatement", [node.children[0], func]))
+        elif klass == "ClassDeclarationStatement":
+            header = node.children[0]
+            class_name = header.children[0].token
+            parent_name = header.children[1].token if len(header.children) > 1 else None
+            function_names, function_nodes = [], []
+            if len(node.children) > 1:
+                for declaration_statement in node.children[-1].children:
+                    function_names.append(declaration_statement.children[0].token)
+                    function_nodes.append(ast.Node("FunctionDeclaration", declaration_statement.children[1:]))
+            self.statement(NodeConstructor.make_type_call_node(class_name, parent_name, function_names, function_nodes))
+        elif klass == "ExpressionStatement":
+            self.expression(node.children[0])
+            self.emit(POP)
+        elif klass == "EmptyStatement":
+            pass
+        else:
+            raise Exception("evaluate not implemented yet for node {}".format(klass))
+
+    def expression(self, node):
+        while not isinstance(node, ast.Leaf) and node.klass in pass_through_nodes:
+            node = node.children[0]
+        if isinstance(node, ast.Leaf):
+            return self.leaf(node)
+        klass = node.klass
+        if klass in binary_operator_nodes:
+            if len(node.children) == 1:
+                return self.expression(node.children[0])
+            site = OperatorSite("__" + node.children[1].children[0].klass + "__")
+            self.expression(node.children[0])
+            #`and` and `or` skip their right operand, and the operator, when the left operand decides the result. See OperatorSite.
+            if site.short_circuit is not None:
+                skip_jump = self.emit(JUMP_IF_FALSE_NO_POP if site.short_circuit is object_factory.builtins["False"] else JUMP_IF_TRUE_NO_POP)
+            self.expression(node.children[2])
+            self.code.operator_sites.append(site)
+            self.emit(BINARY_OP, len(self.code.operator_sites) - 1)
+            if site.short_circuit is not None:
+                self.patch(skip_jump, self.here())
+        elif klass == "UnaryOpExpression":
+            if len(node.children) == 1:
+                return self.expression(node.children[0])
+            self.expression(node.children[1])
+            self.emit(UNARY_OP, self.name("__" + node.children[0].children[0].klass + "__"))
+        elif klass == "Call":
+            callee = node.children[0]
+            while not isinstance(callee, ast.Leaf) and callee.klass in pass_through_nodes:
+                callee = callee.children[0]
+            #method calls, ex. `x.frob()`, use LOAD_METHOD/CALL_METHOD so that no bound method is created.
+            is_method_call = not isinstance(callee, ast.Leaf) and callee.klass == "AttributeRef"
+            if is_method_call:
+                self.expression(callee.children[0])
+                self.emit(LOAD_METHOD, self.name(callee.children[1].token.value))
+            else:
+                self.expression(callee)
+            arguments = node.children[1].children if len(node.children) > 1 else []
+            for argument in arguments:
+                self.expression(argument)
+            pc = self.emit(CALL_METHOD if is_method_call else CALL, len(arguments))
+            self.code.call_nodes[pc] = node
+        elif klass == "AttributeRef":
+            self.expression(node.children[0])
+            self.emit(LOAD_ATTR, self.name(node.children[1].token.value))
+        elif klass == "Subscript":
+            self.expression(NodeConstructor.make_method_call_expression_node(node.children[0], "__getitem__", [node.children[1]]))
+        elif klass == "FoldedConstant":
+            #use the folded value, unless the operators it was folded with have been overridden since.
+            original_jump = self.emit(JUMP_IF_OPERATORS_CHANGED)
+            self.leaf(node.children[0])
+            end_jump = self.emit(JUMP)
+            self.patch(original_jump, self.here())
+            self.expression(node.children[1])
+            self.patch(end_jump, self.here())
+        elif klass == "ListDisplay":
+            items = node.children[0].children if node.children else []
+            for item in items:
+                self.expression(item)
+            self.emit(BUILD_LIST, len(items))
+        elif klass == "DictDisplay":
+            pairs = node.children[0].children if node.children else []
+            for pair in pairs:
+                self.expression(pair.children[0])
+                self.expression(pair.children[1])
+            self.emit(BUILD_DICT, len(pairs))
+        elif klass == "ListComp":
+            self.expression(node.children[2])
+            self.emit(COMP_START, self.name(node.children[1].token.value))
+            start = self.emit(COMP_NEXT)
+            self.expression(node.children[0])
+            self.emit(COMP_APPEND)
+            self.emit(JUMP, start)
+            self.patch(start, self.here())
+        elif klass == "GeneratorComp":
+            self.expression(node.children[2])
+            expression_code = Compiler(node.children[0], [node.children[1].token.value]).compile_expression_body()
+            self.emit(GEN_COMP, self.constant(expression_code))
+        elif klass == "FunctionDeclaration":
+            if len(node.children) > 1:
+                arguments = [child.token.value for child in node.children[0].children[0].children]
+                body = node.children[1]
+            else:  # no arguments
+                arguments = []
+                body = node.children[0]
+            self.emit(MAKE_FUNCTION, self.constant(Compiler(body, arguments, resolver.contains_yield(body)).compile_body()))
+        else:
+            raise Exception("evaluate not implemented yet for node {}".format(klass))
+
+    def leaf(self, node):
+        token = node.token
+        if token.klass.name == "number":
+            self.emit(LOAD_CONST, self.constant(int(token.value)))
+        elif token.klass.name == "identifier":
+            self.emit(LOAD_NAME, self.name(token.value))
+        elif token.klass.name == "string_literal":
+            self.emit(LOAD_CONST, self.constant(token.value[1:-1]))
+        else:
+            raise Exception("evaluate not implemented yet for leaf {}".format(token))
+
+
+#compiles a whole program into a Code object.
+def compile_program(node):
+    return Compiler(node).compile_body()
@@ -1,4 +1,7 @@
-from ks.kobjects import ObjectFactory
+from itertools import islice
+
+from ks import resolver
+from ks.kobjects import KObject, ObjectFactory
 from ks.parser import ast, lex
 from ks.parser.ast import Leaf, Node
 
@@ -17,28 +20,297 @@ def extract_identifiers(node):
 
 
 def evaluate_function(func, scopes=None, argument_values=None):
-    if scopes == None:
-        scopes = []
     if argument_values == None:
         argument_values = []
-    assert all(isinstance(value, dict) for value in argument_values), "expected native objects as arguments, got {} instead".format([type(x) for x in argument_values])
+    assert all(isinstance(value, KObject) for value in argument_values), "expected native objects as arguments, got {} instead".format([type(x) for x in argument_values])
 
-    if isinstance(func["private"]["body"], ast.Node):
+    private = func.data
+    if isinstance(private["body"], ast.Node):
+        #pure KS func created by another execution engine, which knows how to run its own functions.
+        executor = private.get("executor")
+        if executor is not None:
+            return executor(func, argument_values)
         #pure KS func
-        assert len(argument_values) == len(func["private"]["arguments"]), "expected {} argument(s) for function call, got {}".format(len(func["private"]["arguments"]), len(argument_values))
-        locals = {}
-        for i in range(len(argument_values)):
-            name = func["private"]["arguments"][i]
-            value = argument_values[i]
-            locals[name] = value
-        result = evaluate(
-            func["private"]["body"],
-            func["private"]["closure"] + [locals]
-        )
+        arguments = private["arguments"]
+        assert len(argument_values) == len(arguments), "expected {} argument(s) for function call, got {}".format(len(arguments), len(argument_values))
+        body = private["body"]
+        #the body's scope was worked out by the resolver. Arguments are bound first, so they get the first slots.
+        scope = body.scope
+        values = [unset] * scope.size
+        names = scope.names
+        for name, value in zip(arguments, argument_values):
+            values[names[name]] = value
+        closure = private["closure"]
+        frame = Frame(values, names, closure if isinstance(closure, Frame) else None)
+        #calling a generator function doesn't run its body; the Generator runs it as items are requested.
+        if body.is_generator:
+            return object_factory.make_Generator(generate(body, frame))
+        result = evaluate(body, frame)
         return result["value"]
     else:
         #external code func
-        return func["private"]["body"](scopes, *argument_values)
+        return private["body"](scopes, *argument_values)
+
+
+#the local variables of one function call, or of one item of a list comprehension.
+#`values` holds one slot per name in the scope's `names` dict; see resolver.py.
+#`parent` is the frame the function was defined in, or None for functions defined at the top level.
+class Frame(object):
+    __slots__ = ("values", "names", "parent")
+
+    def __init__(self, values, names, parent):
+        self.values = values
+        self.names = names
+        self.parent = parent
+
+
+#marks a local variable slot that hasn't been assigned yet.
+unset = object()
+
+
+#looks up a name the slow way, starting at `frame` and moving outwards.
+#used for locals that are read before they're assigned, and for nodes created after the resolver ran.
+def lookup_name(name, frame):
+    while frame is not None:
+        slot = frame.names.get(name)
+        if slot is not None and frame.values[slot] is not unset:
+            return frame.values[slot]
+        frame = frame.parent
+    if name in builtins:
+        return builtins[name]
+    raise Exception("Unrecognized name \"{}\"".format(name))
+
+
+#returns the value of the variable named by an identifier Leaf.
+def get_var(node, frame):
+    address = getattr(node, "address", unresolved)
+    if address is None:
+        name = node.token.value
+        if name in builtins:
+            return builtins[name]
+        raise Exception("Unrecognized name \"{}\"".format(name))
+    if address is unresolved:
+        return lookup_name(node.token.value, frame)
+    depth, slot = address
+    while depth:
+        frame = frame.parent
+        depth -= 1
+    value = frame.values[slot]
+    if value is unset:
+        return lookup_name(node.token.value, frame.parent)
+    return value
+
+
+#assigns a value to the variable named by an identifier Leaf.
+def set_var(node, frame, value):
+    address = getattr(node, "address", unresolved)
+    if address is unresolved:
+        address = None if frame is None else (0, frame.names[node.token.value])
+    if address is None:
+        builtins[node.token.value] = value
+    else:
+        frame.values[address[1]] = value
+
+
+#marks identifier Leaves that the resolver hasn't seen.
+unresolved = object()
+
+
+def is_func(obj):
+    data = obj.data
+    return data is not None and "body" in data and "arguments" in data and "closure" in data
+
+
+#returns the function that actually runs when `callable` is called, following `__call__` methods.
+#`__call__` instance methods are called directly, so their receiver is inserted at the start of `argument_values`.
+def unwrap_callable(callable, argument_values):
+    while not is_func(callable):
+        attr, is_method = find_attribute(callable, "__call__")
+        if attr is None:
+            break
+        if is_method:
+            argument_values.insert(0, callable)
+        callable = attr
+    return callable
+
+
+class OperatorSite(object):
+    """
+    One binary operator in the program, ex. the `+` in `i + 1`, which specializes itself to the operands it sees.
+    The first time the operator's method turns out to be a native method of Integer or String, the site records the operand types and the method's host function.
+    After that, as long as the operands have the same types and no type's methods have changed, it calls the host function directly,
+    skipping the method lookup, the argument list, and `evaluate_function`.
+    Anything else takes the generic path, which re-specializes the site if it can.
+    """
+    __slots__ = ("name", "left_type", "right_type", "host_func", "version", "short_circuit")
+
+    def __init__(self, name):
+        #the operator's method name, ex. "__add__"
+        self.name = name
+        self.left_type = None
+        self.right_type = None
+        self.host_func = None
+        self.version = None
+        #for `and` and `or`, the Boolean left operand that decides the result by itself. The right operand isn't evaluated, and the result is the left operand.
+        #other left operands, including user-defined types, still have their method called. None for other operators.
+        self.short_circuit = {"__and__": builtins["False"], "__or__": builtins["True"]}.get(name)
+
+    #returns the result of the operator if it can be computed on the fast path, otherwise None.
+    def fast_call(self, left, right):
+        if left.type is self.left_type and right.type is self.right_type and left.attributes is None and self.version == object_factory.method_table_version:
+            return object_factory.make(self.host_func(left, right))
+        return None
+
+    #finds the operator's method for the generic path. Specializes the site if the method can be called directly.
+    #returns the same (func, is_method) pair as `find_attribute`.
+    def find_method(self, left, right):
+        func, is_method = find_attribute(left, self.name)
+        assert func, "object {} has no method {}".format(object_factory.get_type_name(left), self.name)
+        host_func = func.data.get("host_func") if is_method else None
+        if host_func is not None and left.type in fast_operand_types and right.type in fast_operand_types:
+            self.left_type = left.type
+            self.right_type = right.type
+            self.host_func = host_func
+            self.version = object_factory.method_table_version
+        return func, is_method
+
+    def call(self, left, right, scopes):
+        result = self.fast_call(left, right)
+        if result is not None:
+            return result
+        func, is_method = self.find_method(left, right)
+        return evaluate_function(func, scopes, [left, right] if is_method else [right])
+
+
+"""
+returns a host iterator over the items of a KS object. Used by `for` loops and list comprehensions in every engine.
+Lists, Ranges, IntArrays, Iterators and Generators are iterated over directly.
+Other objects use their `__iter__` method, and the `__next__` method of the object it returns, until `__next__` returns StopIteration.
+Objects without `__iter__` fall back to their `size` and `__getitem__` methods.
+"""
+#the built-in types are iterated over directly, as long as their iteration methods haven't been overridden. See `natively_iterable_types`.
+def iterate(seq, scopes=None):
+    type = seq.type
+    if seq.attributes is None and type in natively_iterable_types():
+        if type is builtins["List"]:
+            return islice(seq.items, len(seq.items))
+        if type is builtins["Range"] or type is builtins["IntArray"]:
+            return map(object_factory.make, seq.value)
+        return seq.value
+    if has_attribute(seq, "__iter__"):
+        return iterate_protocol(call_method(seq, "__iter__", [], scopes), scopes)
+    assert has_attribute(seq, "size"), "Can't iterate over type {} with no `size` function".format(object_factory.get_type_name(seq))
+    assert has_attribute(seq, "__getitem__"), "Can't iterate over type {} with no `__getitem__` function".format(object_factory.get_type_name(seq))
+    return iterate_by_index(seq, scopes)
+
+
+def iterate_protocol(iterator, scopes):
+    if (iterator.type is builtins["Iterator"] or iterator.type is builtins["Generator"]) and iterator.attributes is None and iterator.type in natively_iterable_types():
+        return iterator.value
+    return iterate_by_next(iterator, scopes)
+
+
+def iterate_by_next(iterator, scopes):
+    stop = builtins["StopIteration"]
+    while True:
+        item = call_method(iterator, "__next__", [], scopes)
+        if item is stop:
+            return
+        yield item
+
+
+def iterate_by_index(seq, scopes):
+    size = call_method(seq, "size", [], scopes).value
+    for idx in range(size):
+        yield call_method(seq, "__getitem__", [object_factory.make(idx)], scopes)
+
+
+#yielded by the statement runners of generator functions when a `return` statement runs. Every engine's runners use it.
+generator_return = object()
+
+
+#runs the body of a generator function, yielding the value of each `yield` statement it reaches.
+def generate(body, frame):
+    for value in run_generator_statement(body, frame):
+        if value is generator_return:
+            return
+        yield value
+
+
+#runs a statement inside a generator function's body. Works like `evaluate`, but is a host generator,
+#so that `yield` statements can suspend it along with every statement that contains them.
+#statements that can't contain a `yield` are passed to `evaluate`.
+def run_generator_statement(node, frame):
+    klass = node.klass
+    if klass in ("Statement", "StatementList"):
+        for child in node.children:
+            for value in run_generator_statement(child, frame):
+                yield value
+                if value is generator_return:
+                    return
+    elif klass == "YieldStatement":
+        yield evaluate(node.children[0], frame)
+    elif klass == "ReturnStatement":
+        #the returned value is ignored, but evaluating it may have side effects.
+        evaluate(node.children[0], frame)
+        yield generator_return
+    elif klass == "WhileStatement":
+        while True:
+            cond = evaluate(node.children[0], frame)
+            assert object_factory.get_type_name(cond) == "Boolean", "expected Boolean, got {}".format(object_factory.get_type_name(cond))
+            if cond is not builtins["True"]:
+                break
+            for value in run_generator_statement(node.children[1], frame):
+                yield value
+                if value is generator_return:
+                    return
+    elif klass == "ForStatement":
+        for item in iterate(evaluate(node.children[1], frame), frame):
+            set_var(node.children[0], frame, item)
+            for value in run_generator_statement(node.children[2], frame):
+                yield value
+                if value is generator_return:
+                    return
+    elif klass == "IfStatement":
+        cond = evaluate(node.children[0], frame)
+        assert object_factory.get_type_name(cond) == "Boolean", "expected Boolean, got {}".format(object_factory.get_type_name(cond))
+        if cond is builtins["True"]:
+            branch = node.children[1]
+        elif len(node.children) > 2:
+            branch = node.children[2]
+        else:
+            return
+        for value in run_generator_statement(branch, frame):
+            yield value
+            if value is generator_return:
+                return
+    else:
+        if evaluate(node, frame)["returning"]:
+            yield generator_return
+
+
+#yields the value of a generator comprehension's expression for each item.
+def generate_comprehension(expression, names, frame, items):
+    for item in items:
+        yield evaluate(expression, Frame([item], names, frame))
+
+
+#returns the object a number or string literal token stands for.
+def make_literal(token):
+    if token.klass.name == "number":
+        return object_factory.make(int(token.value))
+    elif token.klass.name == "string_literal":
+        return object_factory.make(token.value[1:-1])
+    else:
+        raise Exception("evaluate not implemented yet for leaf {}".format(token))
+
+
+#returns the position of the first token in the node.
+def line(node):
+    if isinstance(node, ast.Leaf):
+        return node.token.position
+    else:
+        return line(node.children[0])
 
 
 #static class containing methods that are useful in transforming the AST.
@@ -117,50 +389,51 @@ class NodeConstructor:
         return Node("Call", children)
 
 
-def evaluate(node, scopes=None):
-    if scopes == None:
-        scopes = [builtins]
+# classes that just pass its single child forward
+pass_through_nodes = frozenset("Expression Value Enclosure Literal Atom Primary".split())
 
-    def get_var(name):
-        for scope in scopes[::-1]:
-            if name in scope:
-                return scope[name]
-        raise Exception("Unrecognized name \"{}\"".format(name))
+binary_operator_nodes = frozenset("AddExpression CompExpression MultExpression BinOpExpression".split())
 
-    def line(node):
-        if isinstance(node, ast.Leaf):
-            return node.token.position
-        else:
-            return line(node.children[0])
 
-    statement_default_return_value = {"returning": False, "value": builtins["None"]}
+#runs a whole program. The program's top level uses the builtins as its scope.
+def evaluate_program(node):
+    resolver.resolve(node)
+    return evaluate(node)
+
 
+#evaluates a node within a frame. `frame` is None for code at the top level of the program.
+#the tree should already have been through `resolver.resolve`; see `evaluate_program`.
+def evaluate(node, frame=None):
     if isinstance(node, ast.Leaf):
-        if node.token.klass.name == "number":
-            return object_factory.make(int(node.token.value))
-        elif node.token.klass.name == "identifier":
-            return get_var(node.token.value)
-        elif node.token.klass.name == "string_literal":
-            return object_factory.make(node.token.value[1:-1])
-        else:
-            raise Exception("evaluate not implemented yet for leaf {}".format(node.token))
+        if node.token.klass.name == "identifier":
+            return get_var(node, frame)
+        #literals are converted once, and the same object is used every time the leaf is evaluated.
+        constant = getattr(node, "constant", None)
+        if constant is None:
+            constant = node.constant = make_literal(node.token)
+        return constant
     else:
         # classes that just pass its single child forward
-        if node.klass in "Expression Value Enclosure Literal Atom Primary".split():
-            return evaluate(node.children[0], scopes)
+        if node.klass in pass_through_nodes:
+            return evaluate(node.children[0], frame)
+        # an operator expression that the optimizer computed ahead of time. see `operators_are_native`.
+        if node.klass == "FoldedConstant":
+            if operators_are_native():
+                return evaluate(node.children[0], frame)
+            return evaluate(node.children[1], frame)
 
         # statements.
         # when evaluated, all statements should return one of two values:
         # {"returning": True, "value": return_value} - when a `Return` statement was executed, and we need to move back up to the most recent function call
         # `statement_default_return_value` - when no return statement has been executed.
         if node.klass == "Statement":
-            result = evaluate(node.children[0], scopes)
+            result = evaluate(node.children[0], frame)
             if result["returning"]:
                 return result
             return statement_default_return_value
         elif node.klass == "StatementList":
             for child in node.children:
-                ret = evaluate(child, scopes)
+                ret = evaluate(child, frame)
                 if ret["returning"]:
                     return ret
             return statement_default_return_value
@@ -168,60 +441,53 @@ def evaluate(node, scopes=None):
             lhs, expression_node = node.children
             # identifier assignment
             if isinstance(lhs, ast.Leaf):
-                scopes[-1][lhs.token.value] = evaluate(expression_node, scopes)
+                set_var(lhs, frame, evaluate(expression_node, frame))
             # attribute assignment
             elif lhs.klass == "AttributeRef":
-                node = evaluate(lhs.children[0], scopes)
+                node = evaluate(lhs.children[0], frame)
                 attribute_name = lhs.children[1].token.value
-                node["public"][attribute_name] = evaluate(expression_node, scopes)
+                set_attribute(node, attribute_name, evaluate(expression_node, frame))
             #subscript assignment
             else:
                 obj = lhs.children[0]
                 arguments = [lhs.children[1], expression_node]
                 node = NodeConstructor.make_method_call_expression_node(obj, "__setitem__", arguments)
-                evaluate(node, scopes)
+                evaluate(node, frame)
             return statement_default_return_value
         elif node.klass == "ReturnStatement":
-            value = evaluate(node.children[0], scopes)
+            value = evaluate(node.children[0], frame)
             return {"returning": True, "value": value}
         elif node.klass == "WhileStatement":
             while True:
-                cond = evaluate(node.children[0], scopes)
+                cond = evaluate(node.children[0], frame)
                 if not object_factory.get_type_name(cond) == "Boolean":
                     cond = cond.bool()
                 if cond is not builtins["True"]:
                     break
-                result = evaluate(node.children[1], scopes)
+                result = evaluate(node.children[1], frame)
                 if result["returning"]:
                     return result
             return statement_default_return_value
-        # expression must evaluate to an object that has a `size` and `at` method
+        # expression must evaluate to an object that can be iterated over. See `iterate`.
         elif node.klass == "ForStatement":
-            identifier = node.children[0].token.value
-            seq = evaluate(node.children[1], scopes)
-            size_func = get_attribute(seq, "size")
-            at_func = get_attribute(seq, "__getitem__")
-            assert size_func, "Can't iterate over type {} with no `size` function".format(object_factory.get_type_name(seq))
-            assert at_func, "Can't iterate over type {} with no `__getitem__` function".format(object_factory.get_type_name(seq))
-            size = evaluate_function(size_func, scopes, [])["private"]["value"]
-            for idx in range(size):
-                item = evaluate_function(at_func, scopes, [object_factory.make(idx)])
-                scopes[-1][identifier] = item
-                result = evaluate(node.children[2], scopes)
+            seq = evaluate(node.children[1], frame)
+            for item in iterate(seq, frame):
+                set_var(node.children[0], frame, item)
+                result = evaluate(node.children[2], frame)
                 if result["returning"]:
                     return result
             return statement_default_return_value
         elif node.klass == "IfStatement":
-            cond = evaluate(node.children[0], scopes)
+            cond = evaluate(node.children[0], frame)
             if not object_factory.get_type_name(cond) == "Boolean":
                 cond = cond.bool()
             assert object_factory.get_type_name(cond) == "Boolean", "expected Boolean, got {}".format(object_factory.get_type_name(cond))
             if cond is builtins["True"]:
-                result = evaluate(node.children[1], scopes)
+                result = evaluate(node.children[1], frame)
                 if result["returning"]:
                     return result
             elif len(node.children) > 2:
-                result = evaluate(node.children[2], scopes)
+                result = evaluate(node.children[2], frame)
                 if result["returning"]:
                     return result
             return statement_default_return_value
@@ -231,7 +497,7 @@ def evaluate(node, scopes=None):
             func = ast.Node("FunctionDeclaration", node.children[1:])
             id = node.children[0]
             assignment = ast.Node("AssignmentStatement", [id, func])
-            return evaluate(assignment, scopes)
+            return evaluate(assignment, frame)
         elif node.klass == "ClassDeclarationStatement":
             header = node.children[0]
             class_name = header.children[0].token
@@ -245,99 +511,177 @@ def evaluate(node, scopes=None):
                     function_names.append(name)
                     function_nodes.append(func)
             type_call_node = NodeConstructor.make_type_call_node(class_name, parent_name, function_names, function_nodes)
-            return evaluate(type_call_node, scopes)
+            #the new assignment target is a new Leaf, so it needs the class name's address.
+            type_call_node.children[0].children[0].address = getattr(header.children[0], "address", unresolved)
+            return evaluate(type_call_node, frame)
         elif node.klass == "ExpressionStatement":
-            evaluate(node.children[0], scopes)
+            evaluate(node.children[0], frame)
             return statement_default_return_value
         elif node.klass == "EmptyStatement":
             return statement_default_return_value
+        #yield statements inside generator functions are run by `run_generator_statement`, so any that get here are misplaced.
+        elif node.klass == "YieldStatement":
+            raise Exception("`yield` outside of a function, at {}".format(line(node)))
 
         elif node.klass == "FunctionDeclaration":
             if len(node.children) > 1:
-                arguments = evaluate(node.children[0], scopes)
+                arguments = evaluate(node.children[0], frame)
                 body = node.children[1]
             else:  # no arguments
                 arguments = []
                 body = node.children[0]
-            return object_factory.make_Function(body, arguments, scopes)
+            return object_factory.make_Function(body, arguments, frame)
         elif node.klass == "FunctionDeclarationArgumentList":
-            return evaluate(node.children[0], scopes)
+            return evaluate(node.children[0], frame)
 
         # note: this only gets evaluated for AttributeRefs not belonging to an AssignmentStatement.
         # Those nodes are handled specially in the AssignmentStatement block.
         elif node.klass == "AttributeRef":
-            obj = evaluate(node.children[0], scopes)
+            obj = evaluate(node.children[0], frame)
             attribute_name = node.children[1].token.value
             attr = get_attribute(obj, attribute_name)
             assert attr, "{} object has no attribute '{}'".format(object_factory.get_type_name(obj), attribute_name)
             return attr
         # like AttributeRef above, this only gets evaluated for subscripts not in an AssignmentStatement.
         elif node.klass == "Subscript":
-            obj = evaluate(node.children[0], scopes)
+            obj = evaluate(node.children[0], frame)
             node = NodeConstructor.make_method_call_expression_node(node.children[0], "__getitem__", [node.children[1]])
-            return evaluate(node, scopes)
+            return evaluate(node, frame)
         elif node.klass == "Call":
-            callable = evaluate(node.children[0], scopes)
+            #method calls, ex. `x.frob()`, call the method directly with `x` as the first argument, without creating a bound method.
+            callee = node.children[0]
+            while not isinstance(callee, ast.Leaf) and callee.klass in pass_through_nodes:
+                callee = callee.children[0]
+            if not isinstance(callee, ast.Leaf) and callee.klass == "AttributeRef":
+                obj = evaluate(callee.children[0], frame)
+                attribute_name = callee.children[1].token.value
+                callable, is_method = find_attribute(obj, attribute_name)
+                assert callable, "{} object has no attribute '{}'".format(object_factory.get_type_name(obj), attribute_name)
+                receivers = [obj] if is_method else []
+            else:
+                callable = evaluate(callee, frame)
+                receivers = []
             if len(node.children) == 1:
-                arguments = []
+                arguments = receivers
             else:
-                arguments = evaluate(node.children[1], scopes)
-            is_func = lambda obj: all(attr in obj["private"] for attr in ("body", "arguments", "closure"))
-            while has_attribute(callable, "__call__") and not is_func(callable):
-                callable = get_attribute(callable, "__call__")
+                arguments = receivers + evaluate(node.children[1], frame)
+            callable = unwrap_callable(callable, arguments)
             assert is_func(callable), "expected callable, got {} at {}".format(object_factory.get_type_name(callable), line(node))
             try:
-                return evaluate_function(callable, scopes, arguments)
+                return evaluate_function(callable, frame, arguments)
             except:
                 print("Couldn't call function on line {}".format(line(node)))
                 raise
         elif node.klass == "ExpressionList":
-            return [evaluate(child, scopes) for child in node.children]
+            return [evaluate(child, frame) for child in node.children]
         elif node.klass == "IdentifierList":
             return [child.token.value for child in node.children]
         elif node.klass == "UnaryOpExpression":
             #behavior is effectively identical to Add/Comp/Mult/BinOpExpression, except with only one argument
             if len(node.children) == 1:
-                return evaluate(node.children[0], scopes)
+                return evaluate(node.children[0], frame)
             else:
                 operator = node.children[0].children[0].klass
-                value = evaluate(node.children[1], scopes)
+                value = evaluate(node.children[1], frame)
                 func_name = "__" + operator + "__"
-                method = get_attribute(value, func_name)
-                assert method, "object {} has no method {}".format(object_factory.get_type_name(value), func_name)
-
-                return evaluate_function(method, scopes, [])
-        elif node.klass in "AddExpression CompExpression MultExpression BinOpExpression".split():
+                return call_method(value, func_name, [], frame)
+        elif node.klass in binary_operator_nodes:
             if len(node.children) == 1:
-                return evaluate(node.children[0], scopes)
+                return evaluate(node.children[0], frame)
             else:
-                left = evaluate(node.children[0], scopes)
-                operator = node.children[1].children[0].klass
-                right = evaluate(node.children[2], scopes)
-                func_name = "__" + operator + "__"
-                method = get_attribute(left, func_name)
-                assert method, "object {} has no method {}".format(object_factory.get_type_name(left), func_name)
-
-                return evaluate_function(method, scopes, [right])
+                site = getattr(node, "site", None)
+                if site is None:
+                    operator = node.children[1].children[0].klass
+                    site = node.site = OperatorSite("__" + operator + "__")
+                left = evaluate(node.children[0], frame)
+                if left is site.short_circuit:
+                    return left
+                right = evaluate(node.children[2], frame)
+                return site.call(left, right, frame)
         elif node.klass == "ListDisplay":
             items = []
             if node.children:
-                items = evaluate(node.children[0], scopes)
+                items = evaluate(node.children[0], frame)
             return object_factory.make(items)
+        elif node.klass == "DictDisplay":
+            pairs = []
+            if node.children:
+                for pair in node.children[0].children:
+                    pairs.append((evaluate(pair.children[0], frame), evaluate(pair.children[1], frame)))
+            return object_factory.make_Dict(pairs)
         elif node.klass == "ListComp":
             expression = node.children[0]
             name = node.children[1].token.value
-            iterable = evaluate(node.children[2], scopes)["private"]["items"]
+            iterable = iterate(evaluate(node.children[2], frame), frame)
+            names = node.scope.names
             result = []
             for item in iterable:
-                temp_scope = {name: item}
-                result.append(evaluate(expression, scopes + [temp_scope]))
+                result.append(evaluate(expression, Frame([item], names, frame)))
             return object_factory.make(result)
+        #like a ListComp, but its items are only evaluated as the Generator is iterated over.
+        elif node.klass == "GeneratorComp":
+            items = iterate(evaluate(node.children[2], frame), frame)
+            return object_factory.make_Generator(generate_comprehension(node.children[0], node.scope.names, frame, items))
         else:
             raise Exception("evaluate not implemented yet for node {}".format(node.klass))
 
 
 object_factory = ObjectFactory(evaluate_function)
 builtins = object_factory.builtins
+
+#returned by statements when no return statement has been executed. See `evaluate`.
+statement_default_return_value = {"returning": False, "value": builtins["None"]}
+#the types whose native operator methods `OperatorSite` calls directly.
+fast_operand_types = (builtins["Integer"], builtins["String"])
+#the methods that `iterate` skips calling for the built-in types it iterates over directly, and their native values, keyed by type.
+#a type that doesn't have one of the methods natively has None in its place.
+iteration_methods = ("__iter__", "__next__", "size", "__getitem__")
+native_iteration_methods = {}
+for type_name in ("List", "Range", "IntArray", "Iterator", "Generator"):
+    native_table = object_factory.get_method_table(builtins[type_name])
+    native_iteration_methods[builtins[type_name]] = [native_table.get(method_name) for method_name in iteration_methods]
+#the method table version `natively_iterable_types` last checked at, and its result.
+natively_iterable_checked = {"version": None, "result": ()}
+
+
+#returns the built-in types whose iteration methods are all still native, so `iterate` can read their host values directly.
+#like `operators_are_native`, it's only worked out again when the method tables change.
+def natively_iterable_types():
+    version = object_factory.method_table_version
+    if natively_iterable_checked["version"] != version:
+        natively_iterable_checked["result"] = frozenset(
+            type for type, methods in native_iteration_methods.items()
+            if all(object_factory.get_method_table(type).get(method_name) is method for method_name, method in zip(iteration_methods, methods))
+        )
+        natively_iterable_checked["version"] = version
+    return natively_iterable_checked["result"]
+
+
+#the native operator methods that the optimizer folds literal expressions with, keyed by (type name, method name). See optimizer.py.
+native_operators = {}
+for type_name, method_names in [("Integer", "__add__ __sub__ __mul__ __div__ __mod__ __neg__ __pos__"), ("String", "__add__")]:
+    for method_name in method_names.split():
+        native_operators[type_name, method_name] = object_factory.get_method_table(builtins[type_name])[method_name]
+#the method table version `operators_are_native` last checked at, and its result.
+native_operators_checked = {"version": None, "result": True}
+
+
+#returns True if the operators in `native_operators` haven't been overridden, so constants folded from them are still correct.
+#programs can override them at any time, ex. through an alias of `override_method`, so every FoldedConstant checks this when it's evaluated.
+#the answer only changes when the method tables do, so it's only worked out again when their version changes.
+def operators_are_native():
+    version = object_factory.method_table_version
+    if native_operators_checked["version"] != version:
+        native_operators_checked["result"] = all(
+            object_factory.get_method_table(builtins[type_name]).get(method_name) is method
+            for (type_name, method_name), method in native_operators.items()
+        )
+        native_operators_checked["version"] = version
+    return native_operators_checked["result"]
+
+
 get_attribute = object_factory.get_attribute
 has_attribute = object_factory.has_attribute
+find_attribute = object_factory.find_attribute
+set_attribute = object_factory.set_attribute
+call_method = object_factory.call_method
@@ -0,0 +1,470 @@
+#eval_closure.py - an execution engine that compiles the AST into nested Python closures before running it.
+#`evaluate` in eval_ast.py decides what to do with a node every time it visits it.
+#Here, that decision is made once per node, when the tree is compiled, and running the program is just a matter of calling closures.
+#The semantics are the same as eval_ast's; see `evaluate` there for the reasoning behind each node type's behavior.
+
+from ks import resolver
+from ks.eval_ast import NodeConstructor, OperatorSite, builtins, call_method, evaluate_function, find_attribute, generator_return, get_attribute, is_func, iterate, line, make_literal, object_factory, operators_are_native, set_attribute, unwrap_callable
+from ks.parser import ast
+
+#compiled statements return this when they finish without executing a `return` statement.
+#Otherwise they return the value being returned.
+normal = object()
+
+#node classes that just pass their single child forward. They don't get closures of their own.
+pass_through_nodes = set("Expression Value Enclosure Literal Atom Primary".split())
+
+binary_operator_nodes = set("AddExpression CompExpression MultExpression BinOpExpression".split())
+
+
+def expect_boolean(cond):
+    assert object_factory.get_type_name(cond) == "Boolean", "expected Boolean, got {}".format(object_factory.get_type_name(cond))
+    return cond
+
+
+#runs a KS function that was created by this engine.
+def run_function(func, argument_values):
+    private = func.data
+    arguments = private["arguments"]
+    assert len(argument_values) == len(arguments), "expected {} argument(s) for function call, got {}".format(len(arguments), len(argument_values))
+    locals = dict(zip(arguments, argument_values))
+    result = private["compiled_body"](private["closure"] + [locals])
+    if result is normal:
+        return builtins["None"]
+    return result
+
+
+#calls any KS callable, given its already evaluated arguments.
+def call(callable, scopes, argument_values, node):
+    callable = unwrap_callable(callable, argument_values)
+    assert is_func(callable), "expected callable, got {} at {}".format(object_factory.get_type_name(callable), line(node))
+    try:
+        if callable.data.get("executor") is run_function:
+            return run_function(callable, argument_values)
+        return evaluate_function(callable, scopes, argument_values)
+    except:
+        print("Couldn't call function on line {}".format(line(node)))
+        raise
+
+
+#returns a closure that takes a list of scopes, and evaluates the node within them.
+#closures for statements return `normal` or a returned value; closures for expressions return a KS object.
+def compile_node(node):
+    if isinstance(node, ast.Leaf):
+        return compile_leaf(node)
+    while node.klass in pass_through_nodes:
+        node = node.children[0]
+        if isinstance(node, ast.Leaf):
+            return compile_leaf(node)
+    compiler = compilers.get(node.klass)
+    if compiler is None:
+        raise Exception("evaluate not implemented yet for node {}".format(node.klass))
+    return compiler(node)
+
+
+def compile_leaf(node):
+    token = node.token
+    if token.klass.name == "identifier":
+        name = token.value
+        def get_var(scopes):
+            for scope in reversed(scopes):
+                if name in scope:
+                    return scope[name]
+            raise Exception("Unrecognized name \"{}\"".format(name))
+        return get_var
+    else:
+        #literals are converted once, when the leaf is compiled.
+        constant = make_literal(token)
+        return lambda scopes: constant
+
+
+def compile_statement(node):
+    return compile_node(node.children[0])
+
+
+def compile_statement_list(node):
+    statements = [compile_node(child) for child in node.children]
+    if len(statements) == 1:
+        return statements[0]
+    def run(scopes):
+        for statement in statements:
+            result = statement(scopes)
+            if result is not normal:
+                return result
+        return normal
+    return run
+
+
+def compile_assignment_statement(node):
+    lhs, expression_node = node.children
+    expression = compile_node(expression_node)
+    # identifier assignment
+    if isinstance(lhs, ast.Leaf):
+        name = lhs.token.value
+        def assign(scopes):
+            scopes[-1][name] = expression(scopes)
+            return normal
+    # attribute assignment
+    elif lhs.klass == "AttributeRef":
+        obj = compile_node(lhs.children[0])
+        attribute_name = lhs.children[1].token.value
+        def assign(scopes):
+            target = obj(scopes)
+            set_attribute(target, attribute_name, expression(scopes))
+            return normal
+    #subscript assignment
+    else:
+        call_node = NodeConstructor.make_method_call_expression_node(lhs.children[0], "__setitem__", [lhs.children[1], expression_node])
+        set_item = compile_node(call_node)
+        def assign(scopes):
+            set_item(scopes)
+            return normal
+    return assign
+
+
+def compile_return_statement(node):
+    expression = compile_node(node.children[0])
+    return expression
+
+
+def compile_while_statement(node):
+    condition = compile_node(node.children[0])
+    body = compile_node(node.children[1])
+    true = builtins["True"]
+    def run(scopes):
+        while expect_boolean(condition(scopes)) is true:
+            result = body(scopes)
+            if result is not normal:
+                return result
+        return normal
+    return run
+
+
+def compile_for_statement(node):
+    identifier = node.children[0].token.value
+    sequence = compile_node(node.children[1])
+    body = compile_node(node.children[2])
+    def run(scopes):
+        local_scope = scopes[-1]
+        for item in iterate(sequence(scopes), scopes):
+            local_scope[identifier] = item
+            result = body(scopes)
+            if result is not normal:
+                return result
+        return normal
+    return run
+
+
+def compile_if_statement(node):
+    condition = compile_node(node.children[0])
+    body = compile_node(node.children[1])
+    else_body = compile_node(node.children[2]) if len(node.children) > 2 else None
+    true = builtins["True"]
+    def run(scopes):
+        if expect_boolean(condition(scopes)) is true:
+            return body(scopes)
+        elif else_body is not None:
+            return else_body(scopes)
+        return normal
+    return run
+
+
+def compile_function_declaration_statement(node):
+    func = ast.Node("FunctionDeclaration", node.children[1:])
+    return compile_node(ast.Node("AssignmentStatement", [node.children[0], func]))
+
+
+def compile_class_declaration_statement(node):
+    header = node.children[0]
+    class_name = header.children[0].token
+    parent_name = header.children[1].token if len(header.children) > 1 else None
+    function_names, function_nodes = [], []
+    if len(node.children) > 1:
+        for declaration_statement in node.children[-1].children:
+            function_names.append(declaration_statement.children[0].token)
+            function_nodes.append(ast.Node("FunctionDeclaration", declaration_statement.children[1:]))
+    return compile_node(NodeConstructor.make_type_call_node(class_name, parent_name, function_names, function_nodes))
+
+
+def compile_expression_statement(node):
+    expression = compile_node(node.children[0])
+    def run(scopes):
+        expression(scopes)
+        return normal
+    return run
+
+
+def compile_empty_statement(node):
+    return lambda scopes: normal
+
+
+#yield statements are compiled by `compile_generator_statement`, so any that get here are misplaced.
+def compile_yield_statement(node):
+    raise Exception("`yield` outside of a function, at {}".format(line(node)))
+
+
+#returns a closure that takes a list of scopes, and returns a host generator that runs the statement,
+#yielding the value of each `yield` statement it reaches, and `generator_return` if a `return` statement runs.
+#see `run_generator_statement` in eval_ast.py.
+def compile_generator_statement(node):
+    klass = node.klass
+    if klass in ("Statement", "StatementList"):
+        statements = [compile_generator_statement(child) for child in node.children]
+        def run(scopes):
+            for statement in statements:
+                for value in statement(scopes):
+                    yield value
+                    if value is generator_return:
+                        return
+    elif klass == "YieldStatement":
+        expression = compile_node(node.children[0])
+        def run(scopes):
+            yield expression(scopes)
+    elif klass == "ReturnStatement":
+        expression = compile_node(node.children[0])
+        def run(scopes):
+            expression(scopes)
+            yield generator_return
+    elif klass == "WhileStatement":
+        condition = compile_node(node.children[0])
+        body = compile_generator_statement(node.children[1])
+        true = builtins["True"]
+        def run(scopes):
+            while expect_boolean(condition(scopes)) is true:
+                for value in body(scopes):
+                    yield value
+                    if value is generator_return:
+                        return
+    elif klass == "ForStatement":
+        identifier = node.children[0].token.value
+        sequence = compile_node(node.children[1])
+        body = compile_generator_statement(node.children[2])
+        def run(scopes):
+            local_scope = scopes[-1]
+            for item in iterate(sequence(scopes), scopes):
+                local_scope[identifier] = item
+                for value in body(scopes):
+                    yield value
+                    if value is generator_return:
+                        return
+    elif klass == "IfStatement":
+        condition = compile_node(node.children[0])
+        body = compile_generator_statement(node.children[1])
+        else_body = compile_generator_statement(node.children[2]) if len(node.children) > 2 else None
+        true = builtins["True"]
+        def run(scopes):
+            if expect_boolean(condition(scopes)) is true:
+                branch = body
+            elif else_body is not None:
+                branch = else_body
+            else:
+                return
+            for value in branch(scopes):
+                yield value
+                if value is generator_return:
+                    return
+    else:
+        statement = compile_node(node)
+        def run(scopes):
+            if statement(scopes) is not normal:
+                yield generator_return
+    return run
+
+
+#returns a closure that takes a generator function's scopes, and returns the Generator that runs its body.
+def compile_generator_body(body):
+    statement = compile_generator_statement(body)
+    make_Generator = object_factory.make_Generator
+    def generate(scopes):
+        for value in statement(scopes):
+            if value is generator_return:
+                return
+            yield value
+    return lambda scopes: make_Generator(generate(scopes))
+
+
+def compile_function_declaration(node):
+    if len(node.children) > 1:
+        arguments = identifier_names(node.children[0])
+        body = node.children[1]
+    else:  # no arguments
+        arguments = []
+        body = node.children[0]
+    if resolver.contains_yield(body):
+        compiled_body = compile_generator_body(body)
+    else:
+        compiled_body = compile_node(body)
+    make_Function = object_factory.make_Function
+    def create(scopes):
+        func = make_Function(body, arguments, scopes, run_function)
+        func.data["compiled_body"] = compiled_body
+        return func
+    return create
+
+
+#returns the names in a FunctionDeclarationArgumentList or IdentifierList node.
+def identifier_names(node):
+    if node.klass == "FunctionDeclarationArgumentList":
+        node = node.children[0]
+    return [child.token.value for child in node.children]
+
+
+def compile_attribute_ref(node):
+    obj = compile_node(node.children[0])
+    attribute_name = node.children[1].token.value
+    def get(scopes):
+        value = obj(scopes)
+        attr = get_attribute(value, attribute_name)
+        assert attr, "{} object has no attribute '{}'".format(object_factory.get_type_name(value), attribute_name)
+        return attr
+    return get
+
+
+def compile_subscript(node):
+    return compile_node(NodeConstructor.make_method_call_expression_node(node.children[0], "__getitem__", [node.children[1]]))
+
+
+def compile_call(node):
+    arguments = compile_expression_list(node.children[1]) if len(node.children) > 1 else lambda scopes: []
+    callee = node.children[0]
+    while not isinstance(callee, ast.Leaf) and callee.klass in pass_through_nodes:
+        callee = callee.children[0]
+    #method calls, ex. `x.frob()`, call the method directly with `x` as the first argument, without creating a bound method.
+    if not isinstance(callee, ast.Leaf) and callee.klass == "AttributeRef":
+        obj = compile_node(callee.children[0])
+        attribute_name = callee.children[1].token.value
+        def run_method(scopes):
+            value = obj(scopes)
+            callable, is_method = find_attribute(value, attribute_name)
+            assert callable, "{} object has no attribute '{}'".format(object_factory.get_type_name(value), attribute_name)
+            argument_values = arguments(scopes)
+            if is_method:
+                argument_values.insert(0, value)
+            return call(callable, scopes, argument_values, node)
+        return run_method
+    function = compile_node(callee)
+    def run(scopes):
+        callable = function(scopes)
+        return call(callable, scopes, arguments(scopes), node)
+    return run
+
+
+def compile_expression_list(node):
+    expressions = [compile_node(child) for child in node.children]
+    return lambda scopes: [expression(scopes) for expression in expressions]
+
+
+def compile_unary_op_expression(node):
+    if len(node.children) == 1:
+        return compile_node(node.children[0])
+    func_name = "__" + node.children[0].children[0].klass + "__"
+    operand = compile_node(node.children[1])
+    def run(scopes):
+        return call_method(operand(scopes), func_name, [], scopes)
+    return run
+
+
+def compile_binary_op_expression(node):
+    if len(node.children) == 1:
+        return compile_node(node.children[0])
+    left_operand = compile_node(node.children[0])
+    site = OperatorSite("__" + node.children[1].children[0].klass + "__")
+    right_operand = compile_node(node.children[2])
+    short_circuit = site.short_circuit
+    if short_circuit is not None:
+        def run_logical(scopes):
+            left = left_operand(scopes)
+            if left is short_circuit:
+                return left
+            return site.call(left, right_operand(scopes), scopes)
+        return run_logical
+    def run(scopes):
+        left = left_operand(scopes)
+        right = right_operand(scopes)
+        return site.call(left, right, scopes)
+    return run
+
+
+def compile_folded_constant(node):
+    constant = compile_node(node.children[0])
+    original = compile_node(node.children[1])
+    def run(scopes):
+        if operators_are_native():
+            return constant(scopes)
+        return original(scopes)
+    return run
+
+
+def compile_list_display(node):
+    make = object_factory.make
+    if not node.children:
+        return lambda scopes: make([])
+    items = compile_expression_list(node.children[0])
+    return lambda scopes: make(items(scopes))
+
+
+def compile_dict_display(node):
+    make_Dict = object_factory.make_Dict
+    if not node.children:
+        return lambda scopes: make_Dict()
+    pairs = [(compile_node(pair.children[0]), compile_node(pair.children[1])) for pair in node.children[0].children]
+    return lambda scopes: make_Dict([(key(scopes), value(scopes)) for key, value in pairs])
+
+
+def compile_list_comp(node):
+    expression = compile_node(node.children[0])
+    name = node.children[1].token.value
+    sequence = compile_node(node.children[2])
+    make = object_factory.make
+    def run(scopes):
+        items = iterate(sequence(scopes), scopes)
+        return make([expression(scopes + [{name: item}]) for item in items])
+    return run
+
+
+def compile_generator_comp(node):
+    expression = compile_node(node.children[0])
+    name = node.children[1].token.value
+    sequence = compile_node(node.children[2])
+    make_Generator = object_factory.make_Generator
+    def generate(scopes, items):
+        for item in items:
+            yield expression(scopes + [{name: item}])
+    def run(scopes):
+        return make_Generator(generate(scopes, iterate(sequence(scopes), scopes)))
+    return run
+
+
+compilers = {
+    "Statement": compile_statement,
+    "StatementList": compile_statement_list,
+    "AssignmentStatement": compile_assignment_statement,
+    "ReturnStatement": compile_return_statement,
+    "WhileStatement": compile_while_statement,
+    "ForStatement": compile_for_statement,
+    "IfStatement": compile_if_statement,
+    "FunctionDeclarationStatement": compile_function_declaration_statement,
+    "ClassDeclarationStatement": compile_class_declaration_statement,
+    "ExpressionStatement": compile_expression_statement,
+    "EmptyStatement": compile_empty_statement,
+    "YieldStatement": compile_yield_statement,
+    "FunctionDeclaration": compile_function_declaration,
+    "AttributeRef": compile_attribute_ref,
+    "Subscript": compile_subscript,
+    "Call": compile_call,
+    "UnaryOpExpression": compile_unary_op_expression,
+    "FoldedConstant": compile_folded_constant,
+    "ListDisplay": compile_list_display,
+    "DictDisplay": compile_dict_display,
+    "ListComp": compile_list_comp,
+    "GeneratorComp": compile_generator_comp,
+}
+for klass in binary_operator_nodes:
+    compilers[klass] = compile_binary_op_expression
+
+
+#compiles and runs a whole program. Has the same signature as eval_ast.evaluate.
+def evaluate(node, scopes=None):
+    if scopes is None:
+        scopes = [builtins]
+    compile_node(node)(scopes)
@@ -0,0 +1,270 @@
+#eval_vm.py - a stack-based virtual machine that runs the bytecode produced by bytecode.py.
+#KS function calls push a frame onto an explicit frame stack instead of recursing in Python,
+#so the depth of KS recursion is limited only by memory, not by Python's recursion limit.
+#Calls in tail position, ex. `return f(x);`, replace the caller's frame instead of pushing a new one,
+#so tail recursive functions run in constant space, however many times they recur.
+#Generator functions run in a call to `run` of their own, which returns at each `yield` and is resumed from a GeneratorState.
+#The semantics are the same as eval_ast's; see `evaluate` there for the reasoning behind each node type's behavior.
+
+from ks.bytecode import *
+from ks.bytecode import compile_program
+from ks.eval_ast import builtins, evaluate_function, find_attribute, get_attribute, is_func, iterate, object_factory, operators_are_native, set_attribute, unwrap_callable
+
+#returned by `next` when an iterator is exhausted.
+exhausted = object()
+
+#pushed by LOAD_METHOD in place of the receiver, when the attribute found isn't an instance method.
+no_receiver = object()
+
+
+#runs a KS function that was created by this engine. Used when host code, such as `print`, calls it.
+def run_function(func, argument_values):
+    code = func.data["code"]
+    assert len(argument_values) == len(code.arguments), "expected {} argument(s) for function call, got {}".format(len(code.arguments), len(argument_values))
+    return run(code, func.data["closure"] + [dict(zip(code.arguments, argument_values))])
+
+
+#calls a generator function created by this engine. Its body doesn't run until the Generator is iterated over.
+#`run` only pushes frames for functions whose executor is `run_function`, so calls to these always come here.
+def run_generator_function(func, argument_values):
+    code = func.data["code"]
+    assert len(argument_values) == len(code.arguments), "expected {} argument(s) for function call, got {}".format(len(code.arguments), len(argument_values))
+    return object_factory.make_Generator(generate(code, func.data["closure"] + [dict(zip(code.arguments, argument_values))]))
+
+
+#the state of a generator function's body between the values it yields.
+class GeneratorState(object):
+    __slots__ = ("pc", "stack", "scopes", "finished")
+
+    def __init__(self, scopes):
+        self.pc = 0
+        self.stack = []
+        self.scopes = scopes
+        self.finished = False
+
+
+def generate(code, scopes):
+    state = GeneratorState(scopes)
+    while True:
+        value = run(code, state.scopes, state)
+        if state.finished:
+            return
+        yield value
+
+
+#yields the value of a generator comprehension's expression for each item.
+def generate_comprehension(code, scopes, items):
+    name = code.arguments[0]
+    for item in items:
+        yield run(code, scopes + [{name: item}])
+
+
+#runs a code object within the given scopes, and returns the value it returns.
+#`state` is given when running the body of a generator function, which starts, or resumes, from it, and returns the next value it yields.
+def run(code, scopes, state=None):
+    make = object_factory.make
+    make_Function = object_factory.make_Function
+    get_type_name = object_factory.get_type_name
+    none = builtins["None"]
+    true = builtins["True"]
+    false = builtins["False"]
+
+    ops, constants, names = code.ops, code.constants, code.names
+    stack = []
+    pc = 0
+    if state is not None:
+        pc, stack = state.pc, state.stack
+    #the frames of the callers of the currently running code, as (code, pc, stack, scopes) tuples.
+    frames = []
+    try:
+        while True:
+            op = ops[pc]
+            arg = ops[pc+1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                name = names[arg]
+                for scope in reversed(scopes):
+                    if name in scope:
+                        stack.append(scope[name])
+                        break
+                else:
+                    raise Exception("Unrecognized name \"{}\"".format(name))
+                continue
+            elif op == LOAD_CONST:
+                stack.append(constants[arg])
+                continue
+            elif op == STORE_NAME:
+                scopes[-1][names[arg]] = stack.pop()
+                continue
+            elif op == POP_JUMP_IF_FALSE:
+                cond = stack.pop()
+                assert get_type_name(cond) == "Boolean", "expected Boolean, got {}".format(get_type_name(cond))
+                if cond is not true:
+                    pc = arg
+                continue
+            elif op == JUMP:
+                pc = arg
+                continue
+            elif op == JUMP_IF_FALSE_NO_POP:
+                if stack[-1] is false:
+                    pc = arg
+                continue
+            elif op == JUMP_IF_TRUE_NO_POP:
+                if stack[-1] is true:
+                    pc = arg
+                continue
+            elif op == JUMP_IF_OPERATORS_CHANGED:
+                if not operators_are_native():
+                    pc = arg
+                continue
+            elif op == POP:
+                stack.pop()
+                continue
+            elif op == LOAD_ATTR:
+                obj = stack.pop()
+                attr = get_attribute(obj, names[arg])
+                assert attr, "{} object has no attribute '{}'".format(get_type_name(obj), names[arg])
+                stack.append(attr)
+                continue
+            elif op == LOAD_METHOD:
+                #pushes the attribute and then its receiver, so CALL_METHOD can call an instance method without binding it.
+                obj = stack.pop()
+                attr, is_method = find_attribute(obj, names[arg])
+                assert attr, "{} object has no attribute '{}'".format(get_type_name(obj), names[arg])
+                stack.append(attr)
+                stack.append(obj if is_method else no_receiver)
+                continue
+            elif op == STORE_ATTR:
+                value = stack.pop()
+                set_attribute(stack.pop(), names[arg], value)
+                continue
+            elif op == RETURN:
+                value = stack.pop()
+                if not frames:
+                    if state is not None:
+                        state.finished = True
+                    return value
+                code, pc, stack, scopes = frames.pop()
+                ops, constants, names = code.ops, code.constants, code.names
+                stack.append(value)
+                continue
+            elif op == YIELD_VALUE:
+                #calls are never pushed onto a generator's frames, so the generator's own code is the one running.
+                state.pc, state.stack, state.scopes = pc, stack, scopes
+                return stack.pop()
+            elif op == LOAD_NONE:
+                stack.append(none)
+                continue
+            elif op == BUILD_LIST:
+                items = stack[len(stack)-arg:]
+                del stack[len(stack)-arg:]
+                stack.append(make(items))
+                continue
+            elif op == BUILD_DICT:
+                #the stack holds each key followed by its value.
+                items = stack[len(stack)-2*arg:]
+                del stack[len(stack)-2*arg:]
+                stack.append(object_factory.make_Dict(zip(items[::2], items[1::2])))
+                continue
+            elif op == MAKE_FUNCTION:
+                function_code = constants[arg]
+                func = make_Function(function_code.body, function_code.arguments, scopes, run_generator_function if function_code.is_generator else run_function)
+                func.data["code"] = function_code
+                stack.append(func)
+                continue
+            elif op == GET_ITER:
+                stack.append(iterate(stack.pop(), scopes))
+                continue
+            elif op == FOR_ITER:
+                item = next(stack[-1], exhausted)
+                if item is exhausted:
+                    stack.pop()
+                    pc = arg
+                else:
+                    stack.append(item)
+                continue
+            elif op == COMP_START:
+                #the comprehension's state: an iterator over the items, the results so far, the scopes outside the comprehension, and the loop variable's name.
+                stack.append([iterate(stack.pop(), scopes), [], scopes, names[arg]])
+                continue
+            elif op == COMP_NEXT:
+                comprehension = stack[-1]
+                item = next(comprehension[0], exhausted)
+                if item is exhausted:
+                    scopes = comprehension[2]
+                    stack[-1] = make(comprehension[1])
+                    pc = arg
+                else:
+                    scopes = comprehension[2] + [{comprehension[3]: item}]
+                continue
+            elif op == COMP_APPEND:
+                value = stack.pop()
+                stack[-1][1].append(value)
+                continue
+            elif op == GEN_COMP:
+                stack.append(object_factory.make_Generator(generate_comprehension(constants[arg], scopes, iterate(stack.pop(), scopes))))
+                continue
+
+            #the remaining instructions all call a function.
+            if op == CALL or op == CALL_METHOD:
+                argument_values = stack[len(stack)-arg:]
+                del stack[len(stack)-arg:]
+                if op == CALL_METHOD:
+                    receiver = stack.pop()
+                    if receiver is not no_receiver:
+                        argument_values.insert(0, receiver)
+                callable = unwrap_callable(stack.pop(), argument_values)
+                assert is_func(callable), "expected callable, got {} at {}".format(get_type_name(callable), code.line(pc-2))
+            elif op == BINARY_OP:
+                right = stack.pop()
+                left = stack.pop()
+                site = code.operator_sites[arg]
+                result = site.fast_call(left, right)
+                if result is not None:
+                    stack.append(result)
+                    continue
+                callable, is_method = site.find_method(left, right)
+                argument_values = [left, right] if is_method else [right]
+            else:  # UNARY_OP
+                value = stack.pop()
+                callable, is_method = find_attribute(value, names[arg])
+                assert callable, "object {} has no method {}".format(get_type_name(value), names[arg])
+                argument_values = [value] if is_method else []
+
+            private = callable.data
+            #bound methods used as first-class values are also called directly, instead of through the bound method's wrapper
+            if "bound_function" in private:
+                argument_values.insert(0, private["bound_self"])
+                callable = private["bound_function"]
+                private = callable.data
+
+            if private.get("executor") is run_function:
+                function_code = private["code"]
+                assert len(argument_values) == len(function_code.arguments), "expected {} argument(s) for function call, got {}".format(len(function_code.arguments), len(argument_values))
+                #if the caller would just return the call's result, there's no need to come back to it.
+                #the callee returns straight to the caller's caller instead.
+                if ops[pc] != RETURN:
+                    frames.append((code, pc, stack, scopes))
+                code = function_code
+                ops, constants, names = code.ops, code.constants, code.names
+                scopes = private["closure"] + [dict(zip(code.arguments, argument_values))]
+                stack = []
+                pc = 0
+            else:
+                stack.append(evaluate_function(callable, scopes, argument_values))
+    except:
+        #report each call that the error passed through, innermost first, as eval_ast does.
+        if ops[pc-2] in (CALL, CALL_METHOD):
+            print("Couldn't call function on line {}".format(code.line(pc-2)))
+        for caller_code, caller_pc, _, _ in reversed(frames):
+            if caller_code.ops[caller_pc-2] in (CALL, CALL_METHOD):
+                print("Couldn't call function on line {}".format(caller_code.line(caller_pc-2)))
+        raise
+
+
+#compiles and runs a whole program. Has the same signature as eval_ast.evaluate.
+def evaluate(node, scopes=None):
+    if scopes is None:
+        scopes = [builtins]
+    return run(compile_program(node), scopes)
@@ -1,5 +1,237 @@
 #kobjects.py - a replacement for the to-be-deprecated ktypes.py
 
+import operator
+from array import array
+from functools import cmp_to_key
+from itertools import islice
+
+
+class KObject(object):
+    """
+    A KS object. Every KS value, including types and functions, is one of these.
+    attributes:
+        type - the object's type, which is also a KObject. None only while the built-in types are being created.
+        value - the host value wrapped by Integers, Strings, Ranges, Iterators, Generators, Dicts and IntArrays. None for other objects.
+        items - the host list wrapped by Lists. None for other objects.
+        attributes - the object's public attributes, other than `type`. None until one is assigned.
+        data - any other host-side state, ex. a Function's body or a Type's name. None until something is stored.
+    Most objects only need the first three, so they are slots rather than entries in a dict.
+
+    Objects used to be {"public": {...}, "private": {...}} dicts.
+    `obj["public"]` and `obj["private"]` still work, and return dict-like views of the same attributes.
+    """
+    __slots__ = ("type", "value", "items", "attributes", "data")
+
+    def __init__(self, type=None, value=None, items=None):
+        self.type = type
+        self.value = value
+        self.items = items
+        self.attributes = None
+        self.data = None
+
+    def __getitem__(self, half):
+        if half == "public":
+            return ObjectView(self, ("type",), "attributes")
+        if half == "private":
+            return ObjectView(self, ("value", "items"), "data")
+        raise KeyError(half)
+
+    def __repr__(self):
+        if self.type is None or self.type.data is None:
+            return "<KObject>"
+        return "<KObject {}>".format(self.type.data["name"])
+
+
+class ObjectView(object):
+    """
+    A dict-like view of one half of a KObject, for code that still uses the old nested dict representation.
+    Keys in `slot_names` are stored in the slots of the same name; all other keys are stored in the dict in the `dict_name` slot.
+    """
+    __slots__ = ("obj", "slot_names", "dict_name")
+
+    def __init__(self, obj, slot_names, dict_name):
+        self.obj = obj
+        self.slot_names = slot_names
+        self.dict_name = dict_name
+
+    def __getitem__(self, key):
+        if key in self.slot_names:
+            value = getattr(self.obj, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        d = getattr(self.obj, self.dict_name)
+        if d is None:
+            raise KeyError(key)
+        return d[key]
+
+    def __setitem__(self, key, value):
+        if key in self.slot_names:
+            setattr(self.obj, key, value)
+            return
+        d = getattr(self.obj, self.dict_name)
+        if d is None:
+            d = {}
+            setattr(self.obj, self.dict_name, d)
+        d[key] = value
+
+    def __contains__(self, key):
+        if key in self.slot_names:
+            return getattr(self.obj, key) is not None
+        d = getattr(self.obj, self.dict_name)
+        return d is not None and key in d
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self):
+        ret = [name for name in self.slot_names if getattr(self.obj, name) is not None]
+        d = getattr(self.obj, self.dict_name)
+        if d is not None:
+            ret.extend(d)
+        return ret
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+class StringBuilder(object):
+    """
+    The pieces of a String that is being built by repeated concatenation, ex. `s = s + x` in a loop.
+    Each concatenation appends to the builder rather than copying the whole String, and the pieces are only joined when a String's value is read.
+    """
+    __slots__ = ("pieces", "length")
+
+    def __init__(self, value):
+        self.pieces = [value]
+        self.length = len(value)
+
+    def append(self, value):
+        self.pieces.append(value)
+        self.length += len(value)
+
+    def join(self):
+        if len(self.pieces) > 1:
+            self.pieces = ["".join(self.pieces)]
+        return self.pieces[0]
+
+
+class BuilderString(KObject):
+    """
+    A String made by concatenation, whose value is the first `length` characters of a StringBuilder.
+    Appending to the builder only adds characters past the end of the Strings that already use it, so they never change.
+    The value is joined the first time it's read, and kept in the usual `value` slot after that,
+    so code that reads `obj.value` doesn't need to know the difference.
+    """
+    __slots__ = ("builder", "length")
+
+    def __init__(self, type, builder):
+        KObject.__init__(self, type)
+        self.builder = builder
+        self.length = builder.length
+
+    def get_value(self):
+        value = get_value_slot(self)
+        if value is None:
+            value = self.builder.join()
+            if len(value) != self.length:
+                value = value[:self.length]
+            set_value_slot(self, value)
+        return value
+
+    value = property(get_value, KObject.value.__set__)
+
+
+get_value_slot = KObject.value.__get__
+set_value_slot = KObject.value.__set__
+
+#Strings shorter than this are concatenated by copying them, which is quicker than using a builder for short strings.
+builder_string_min_length = 256
+
+
+class SliceString(KObject):
+    """
+    A String made by slicing a long String, whose value is `source[start:stop]`.
+    The characters are only copied out of `source` the first time the value is read.
+    Until then, String methods that can, ex. `size`, `find` and `slice`, work on `source` directly. See `string_bounds`.
+    """
+    __slots__ = ("source", "start", "stop")
+
+    def __init__(self, type, source, start, stop):
+        KObject.__init__(self, type)
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def get_value(self):
+        value = get_value_slot(self)
+        if value is None:
+            value = self.source[self.start:self.stop]
+            set_value_slot(self, value)
+            #the copy is all that's needed now, so the source can be freed.
+            self.source = None
+        return value
+
+    value = property(get_value, KObject.value.__set__)
+
+
+#returns a (host str, start, stop) triple whose slice is the value of the String `obj`, without copying a SliceString's characters.
+def string_bounds(obj):
+    if isinstance(obj, SliceString) and get_value_slot(obj) is None:
+        return obj.source, obj.start, obj.stop
+    value = obj.value
+    return value, 0, len(value)
+
+
+#slices shorter than this are copied, rather than made into SliceStrings, which would keep their whole source alive.
+slice_string_min_length = 256
+
+
+class HashedKey(object):
+    """
+    Stands in for a Dict key that defines its own `__hash__` method, so that the host dict can store it.
+    The KS `__hash__` is called once, when the key is stored or looked up. `__eq__` is only called for keys with equal hashes.
+    """
+    __slots__ = ("obj", "hash", "factory")
+
+    def __init__(self, factory, obj):
+        self.obj = obj
+        self.factory = factory
+        result = factory.call_method(obj, "__hash__", [])
+        assert factory.get_type_name(result) == "Integer", "expected __hash__ to return Integer, got {}".format(factory.get_type_name(result))
+        self.hash = result.value
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, HashedKey):
+            return False
+        if self.obj is other.obj:
+            return True
+        return self.factory.call_method(self.obj, "__eq__", [other.obj]) is self.factory.builtins["True"]
+
+
+#the range of Integers that `ObjectFactory.make` keeps cached.
+small_int_min = -5
+small_int_max = 1024
+
+#the range of the signed 64 bit ints that an IntArray holds.
+int_array_min = -2 ** 63
+int_array_max = 2 ** 63 - 1
+int_array_range_error = "IntArray items must be between {} and {}".format(int_array_min, int_array_max)
+
+
+#returns a host array holding the Integers in `values`, which must fit in an IntArray.
+def make_int_array(values):
+    try:
+        return array("q", values)
+    except OverflowError:
+        raise AssertionError(int_array_range_error)
+
 
 class ObjectFactory:
     """arguments:
@@ -8,93 +240,344 @@ class ObjectFactory:
     def __init__(self, eval_func):
         self.eval_func = eval_func
         self.builtins = {}
+        #each type caches a flattened table of the methods its instances can use. See `get_method_table`.
+        #the tables are rebuilt whenever this no longer matches the version they were built at.
+        self.method_table_version = 0
 
-        def connect(target, name, dest):
-            self.builtins[target]["public"][name] = self.builtins[dest]
-
-        type_names = "Object Type Nonetype Function Boolean Integer String List Dict".split()
+        type_names = "Object Type Nonetype Function Boolean Integer String List Dict Range Iterator Generator IntArray".split()
 
         for name in type_names:
             self.builtins[name] = self.make_blank()
         for name in type_names:
-            connect(name, "type", "Type")
-            connect(name, "parent", "Object")
-            self.builtins[name]["private"]["name"] = name
-            self.builtins[name]["private"]["instance_methods"] = {}
+            type = self.builtins[name]
+            type.type = self.builtins["Type"]
+            type.attributes = {"parent": self.builtins["Object"]}
+            type.data = {"name": name, "instance_methods": {}}
 
-        self.builtins["None"] = self.make_blank()
-        connect("None", "type", "Nonetype")
-        connect("Object", "parent", "None")
+        self.builtins["None"] = KObject(self.builtins["Nonetype"])
+        self.builtins["Object"].attributes["parent"] = self.builtins["None"]
+        #Generators are Iterators whose items are produced by a suspended KS function.
+        self.builtins["Generator"].attributes["parent"] = self.builtins["Iterator"]
 
         self.builtins["False"] = self.make_Object("Boolean")
         self.builtins["True"] = self.make_Object("Boolean")
 
+        #returned by `__next__` methods when an iterator has no more items.
+        self.builtins["StopIteration"] = self.make_Object("Object")
+
+        #Integers are immutable, so `make` can return the same object for all uses of a common value.
+        self.small_ints = [KObject(self.builtins["Integer"], value) for value in range(small_int_min, small_int_max + 1)]
+
 
         #used to create user-defined types
         def create_type(obj, name, parent, interleaved_name_function_pairs):
-            obj["public"]["parent"] = parent
-            obj["private"]["name"] = name["private"]["value"]
-            obj["private"]["instance_methods"] = {}
-            seq = interleaved_name_function_pairs["private"]["items"]
+            self.set_attribute(obj, "parent", parent)
+            obj.data = {"name": name.value, "instance_methods": {}}
+            seq = interleaved_name_function_pairs.items
             for i in range(0, len(seq), 2):
                 func_name, func = seq[i], seq[i+1]
-                obj["private"]["instance_methods"][func_name["private"]["value"]] = func
+                obj.data["instance_methods"][func_name.value] = func
+            self.invalidate_method_tables()
         def call_type_instance(type_instance, *args):
             ret = self.make_Object(type_instance)
-            init = self.get_attribute(ret, "__init__")
-            assert init
-            self.eval_func(init, argument_values=args)
+            self.call_method(ret, "__init__", args)
             return ret
         def init_obj(obj, value):
-            obj["private"]["value"] = value
+            obj.value = value
+        #returns the host str, or BuilderString, of `obj + other`.
+        def concatenate(obj, other):
+            other_value = other.value
+            #a BuilderString that ends where its builder does can share the builder with the result.
+            if isinstance(obj, BuilderString) and obj.length == obj.builder.length:
+                builder = obj.builder
+            else:
+                value = obj.value
+                if len(value) + len(other_value) < builder_string_min_length:
+                    return value + other_value
+                builder = StringBuilder(value)
+            builder.append(other_value)
+            return BuilderString(self.builtins["String"], builder)
+        #the bulk List methods below run their loops in host code.
+        #those that compare or add items work on the host values directly when every item is an Integer, or every item is a String.
+        def list_map(obj, func):
+            return [self.call_function(func, [item]) for item in obj.items]
+        def list_filter(obj, func):
+            true = self.builtins["True"]
+            return [item for item in obj.items if self.call_function(func, [item]) is true]
+        def list_reduce(obj, func, initial=None):
+            items = obj.items
+            if initial is None:
+                assert items, "reduce of empty List with no initial value"
+                result, items = items[0], islice(items, 1, None)
+            else:
+                result = initial
+            for item in items:
+                result = self.call_function(func, [result, item])
+            return result
+        def list_sum(obj):
+            items = obj.items
+            if self.same_builtin_type(items, "Integer"):
+                return self.make(sum(item.value for item in items))
+            #other items are added to the first one, so Lists of user-defined types can be summed too.
+            result = items[0]
+            for item in islice(items, 1, None):
+                result = self.call_method(result, "__add__", [item])
+            return result
+        def list_extreme(obj, method_name, host_func):
+            items = obj.items
+            assert items, "expected a non-empty List"
+            if self.same_builtin_type(items, "Integer") or self.same_builtin_type(items, "String"):
+                return host_func(items, key=lambda item: item.value)
+            true = self.builtins["True"]
+            result = items[0]
+            for item in islice(items, 1, None):
+                if self.call_method(item, method_name, [result]) is true:
+                    result = item
+            return result
+        #sorts in place. If `key` is given, it's called once per item, and the items are sorted by its results.
+        def list_sort(obj, key=None):
+            items = obj.items
+            keys = items if key is None else [self.call_function(key, [item]) for item in items]
+            if self.same_builtin_type(keys, "Integer") or self.same_builtin_type(keys, "String"):
+                host_key = lambda pair: pair[0].value
+            else:
+                true = self.builtins["True"]
+                def compare(a, b):
+                    if self.call_method(a[0], "__lt__", [b[0]]) is true:
+                        return -1
+                    if self.call_method(b[0], "__lt__", [a[0]]) is true:
+                        return 1
+                    return 0
+                host_key = cmp_to_key(compare)
+            #host sorting is stable, so items with equal keys keep their order.
+            items[:] = [pair[1] for pair in sorted(zip(keys, items), key=host_key)]
+        def list_extend(obj, other):
+            assert other.items is not None, "expected List, got {}".format(self.get_type_name(other))
+            obj.items.extend(other.items)
+        def list_slice(obj, start, stop=None):
+            return obj.items[start.value:None if stop is None else stop.value]
+        #returns the position of the first item equal to `value`, or -1 if there isn't one.
+        def list_index(obj, value):
+            for idx, item in enumerate(obj.items):
+                if self.equals(item, value):
+                    return idx
+            return -1
+        #an IntArray's `value` is a memoryview of a host array of signed 64 bit ints. Slices are memoryviews of the same array, so they share its items.
+        def int_array_init(obj, source=None):
+            if source is None:
+                values = array("q")
+            elif source.type is self.builtins["Integer"]:
+                values = array("q", [0]) * source.value
+            elif source.items is not None:
+                assert self.same_builtin_type(source.items, "Integer"), "expected a List of Integers"
+                values = make_int_array([item.value for item in source.items])
+            else:
+                assert source.type is self.builtins["Range"] or source.type is self.builtins["IntArray"], "can't make an IntArray from {}".format(self.get_type_name(source))
+                values = make_int_array(source.value)
+            obj.value = memoryview(values)
+        #returns a method that applies `host_operation` to each item and an Integer, or to the items at the same positions of two IntArrays of the same size.
+        def int_array_operation(host_operation):
+            def operation(obj, other):
+                if other.type is self.builtins["Integer"]:
+                    other_value = other.value
+                    return self.make_IntArray(host_operation(item, other_value) for item in obj.value)
+                assert other.type is self.builtins["IntArray"], "expected Integer or IntArray, got {}".format(self.get_type_name(other))
+                assert len(obj.value) == len(other.value), "IntArrays have different sizes {} and {}".format(len(obj.value), len(other.value))
+                return self.make_IntArray(map(host_operation, obj.value, other.value))
+            return operation
+        def int_array_setitem(obj, idx, value):
+            assert int_array_min <= value.value <= int_array_max, int_array_range_error
+            obj.value[idx.value] = value.value
+        def int_array_dot(obj, other):
+            assert len(obj.value) == len(other.value), "IntArrays have different sizes {} and {}".format(len(obj.value), len(other.value))
+            return sum(map(operator.mul, obj.value, other.value))
+        #returns a method that compares two Strings with `host_operation`.
+        def string_comparison(host_operation):
+            def comparison(obj, other):
+                assert other.type is self.builtins["String"], "can't compare String with {}".format(self.get_type_name(other))
+                return host_operation(obj.value, other.value)
+            return comparison
+        def string_size(obj):
+            _, start, stop = string_bounds(obj)
+            return stop - start
+        def string_getitem(obj, idx):
+            source, start, stop = string_bounds(obj)
+            idx = idx.value
+            if idx < 0:
+                idx += stop - start
+            assert 0 <= idx < stop - start, "String index out of range"
+            return source[start + idx]
+        #returns `obj[start:stop]`, with the same meaning for negative and missing positions as in Python.
+        def string_slice(obj, start, stop=None):
+            source, offset, end = string_bounds(obj)
+            start, stop, _ = slice(start.value, None if stop is None else stop.value).indices(end - offset)
+            return self.make_String_slice(source, offset + start, offset + max(start, stop))
+        #returns the position of the first occurrence of `sub` at or after `start`, or -1 if there isn't one.
+        #`start` has the same meaning for negative and out of range positions as in Python.
+        def string_find(obj, sub, start=None):
+            source, offset, end = string_bounds(obj)
+            start = 0 if start is None else slice(start.value, None).indices(end - offset)[0]
+            idx = source.find(sub.value, offset + start, end)
+            return idx if idx == -1 else idx - offset
+        def string_startswith(obj, prefix):
+            source, start, stop = string_bounds(obj)
+            return source.startswith(prefix.value, start, stop)
+        def string_endswith(obj, suffix):
+            source, start, stop = string_bounds(obj)
+            return source.endswith(suffix.value, start, stop)
+        def string_join(obj, seq):
+            assert seq.items is not None, "expected List, got {}".format(self.get_type_name(seq))
+            assert self.same_builtin_type(seq.items, "String"), "expected a List of Strings"
+            return obj.value.join([item.value for item in seq.items])
+        def dict_getitem(obj, key):
+            entry = obj.value.get(self.dict_key(key))
+            assert entry is not None, "key not found in Dict"
+            return entry[1]
+        def dict_get(obj, key, default=None):
+            entry = obj.value.get(self.dict_key(key))
+            if entry is not None:
+                return entry[1]
+            return self.builtins["None"] if default is None else default
+        def dict_delete(obj, key):
+            obj.value.pop(self.dict_key(key), None)
 
         #append `~` to the name of your method if you don't want its return value to be run through `self.make`
         instance_methods = {
             "String":{
                 "__init__": lambda obj: init_obj(obj, ""),
-                "__repr__": lambda obj: obj["private"]["value"],
-                "__add__": lambda obj, other: obj["private"]["value"] + other["private"]["value"]
+                "__repr__": lambda obj: obj.value,
+                "__add__": concatenate,
+                "__lt__": string_comparison(operator.lt),
+                "__gt__": string_comparison(operator.gt),
+                "__eq__": lambda obj, other: other.type is self.builtins["String"] and obj.value == other.value,
+                "size": string_size,
+                "__getitem__": string_getitem,
+                "slice~": string_slice,
+                "find": string_find,
+                "startswith": string_startswith,
+                "endswith": string_endswith,
+                "split": lambda obj, sep=None: [self.make(part) for part in obj.value.split(None if sep is None else sep.value)],
+                "join": string_join,
+                "replace": lambda obj, old, new: obj.value.replace(old.value, new.value),
+                "strip": lambda obj: obj.value.strip(),
+                "__iter__~": lambda obj: self.make_Iterator(self.make(char) for char in obj.value)
             },
             "Integer":{
                 "__init__": lambda obj: init_obj(obj, 0),
-                "__repr__": lambda obj: str(obj["private"]["value"]),
-                "__lt__"  : lambda obj, other: obj["private"]["value"] < other["private"]["value"],
-                "__gt__"  : lambda obj, other: obj["private"]["value"] > other["private"]["value"],
-                "__eq__"  : lambda obj, other: obj["private"]["value"] == other["private"]["value"],
-                "__add__" : lambda obj, other: obj["private"]["value"] + other["private"]["value"],
-                "__sub__" : lambda obj, other: obj["private"]["value"] - other["private"]["value"],
-                "__mul__" : lambda obj, other: obj["private"]["value"] * other["private"]["value"],
-                "__div__" : lambda obj, other: obj["private"]["value"] // other["private"]["value"],
-                "__mod__" : lambda obj, other: obj["private"]["value"] % other["private"]["value"],
-                "__neg__" : lambda obj: -obj["private"]["value"],
-                "__pos__" : lambda obj: +obj["private"]["value"],
+                "__repr__": lambda obj: str(obj.value),
+                "__lt__"  : lambda obj, other: obj.value < other.value,
+                "__gt__"  : lambda obj, other: obj.value > other.value,
+                "__eq__"  : lambda obj, other: obj.value == other.value,
+                "__add__" : lambda obj, other: obj.value + other.value,
+                "__sub__" : lambda obj, other: obj.value - other.value,
+                "__mul__" : lambda obj, other: obj.value * other.value,
+                "__div__" : lambda obj, other: obj.value // other.value,
+                "__mod__" : lambda obj, other: obj.value % other.value,
+                "__neg__" : lambda obj: -obj.value,
+                "__pos__" : lambda obj: +obj.value,
 
 
+            },
+            "Boolean":{
+                "__repr__": lambda obj: "True" if obj is self.builtins["True"] else "False",
+                "__and__" : lambda obj, other: obj is self.builtins["True"] and other is self.builtins["True"],
+                "__or__"  : lambda obj, other: obj is self.builtins["True"] or other is self.builtins["True"]
+            },
+            "Nonetype":{
+                "__repr__": lambda obj: "None"
             },
             "Type":{
-                "__repr__": lambda obj: "<type '{}'>".format(obj["private"]["name"]),
+                "__repr__": lambda obj: "<type '{}'>".format(obj.data["name"]),
                 "__call__~": call_type_instance,
                 "__init__": create_type
             },
             "List":{
-                "size": lambda obj: len(obj["private"]["items"]),
-                "__getitem__~": lambda obj, idx: obj["private"]["items"][idx["private"]["value"]],
-                "__setitem__": lambda obj, idx, value: obj["private"]["items"].__setitem__(idx["private"]["value"], value),
-                "append": lambda obj, value: obj["private"]["items"].append(value)
+                "size": lambda obj: len(obj.items),
+                "__getitem__~": lambda obj, idx: obj.items[idx.value],
+                "__setitem__": lambda obj, idx, value: obj.items.__setitem__(idx.value, value),
+                "append": lambda obj, value: obj.items.append(value),
+                "__repr__": lambda obj: "[" + ", ".join([self.host_repr(item) for item in obj.items]) + "]",
+                "map": list_map,
+                "filter": list_filter,
+                "reduce~": list_reduce,
+                "sum~": list_sum,
+                "min~": lambda obj: list_extreme(obj, "__lt__", min),
+                "max~": lambda obj: list_extreme(obj, "__gt__", max),
+                "sort": list_sort,
+                "extend": list_extend,
+                "slice": list_slice,
+                "index": list_index,
+                "contains": lambda obj, value: list_index(obj, value) != -1,
+                #like the old `size`/`__getitem__` protocol, items appended during iteration aren't visited.
+                "__iter__~": lambda obj: self.make_Iterator(islice(obj.items, len(obj.items)))
+            },
+            #a Dict's `value` is a host dict. Each entry maps a key's host key (see `dict_key`) to a (key, value) pair of KS objects.
+            "Dict":{
+                "__init__": lambda obj: init_obj(obj, {}),
+                "size": lambda obj: len(obj.value),
+                "__getitem__~": dict_getitem,
+                "__setitem__": lambda obj, key, value: obj.value.__setitem__(self.dict_key(key), (key, value)),
+                "get~": dict_get,
+                "contains": lambda obj, key: self.dict_key(key) in obj.value,
+                "delete": dict_delete,
+                "keys": lambda obj: [entry[0] for entry in obj.value.values()],
+                "values": lambda obj: [entry[1] for entry in obj.value.values()],
+                "__repr__": lambda obj: "{" + ", ".join([self.host_repr(key) + ": " + self.host_repr(value) for key, value in obj.value.values()]) + "}",
+                #iterates over the keys. Like Lists, changes made during iteration aren't visited.
+                "__iter__~": lambda obj: self.make_Iterator([entry[0] for entry in obj.value.values()])
+            },
+            #arithmetic and comparisons work item by item, and make a new IntArray. Comparisons give 1 where they're true, and 0 elsewhere.
+            "IntArray":{
+                "__init__": int_array_init,
+                "size": lambda obj: len(obj.value),
+                "__getitem__": lambda obj, idx: obj.value[idx.value],
+                "__setitem__": int_array_setitem,
+                "__add__~": int_array_operation(operator.add),
+                "__sub__~": int_array_operation(operator.sub),
+                "__mul__~": int_array_operation(operator.mul),
+                "__div__~": int_array_operation(operator.floordiv),
+                "__mod__~": int_array_operation(operator.mod),
+                "__lt__~" : int_array_operation(operator.lt),
+                "__gt__~" : int_array_operation(operator.gt),
+                "__eq__~" : int_array_operation(operator.eq),
+                "sum": lambda obj: sum(obj.value),
+                "min": lambda obj: min(obj.value),
+                "max": lambda obj: max(obj.value),
+                "dot": int_array_dot,
+                #a view of part of the array. Changes to either are seen by both.
+                "slice~": lambda obj, start, stop=None: KObject(self.builtins["IntArray"], obj.value[start.value:None if stop is None else stop.value]),
+                "to_list": lambda obj: [self.make(value) for value in obj.value],
+                "__iter__~": lambda obj: self.make_Iterator(self.make(value) for value in obj.value),
+                "__repr__": lambda obj: "IntArray([" + ", ".join([str(value) for value in obj.value]) + "])"
+            },
+            "Range":{
+                "size": lambda obj: len(obj.value),
+                "__getitem__": lambda obj, idx: obj.value[idx.value],
+                "__iter__~": lambda obj: self.make_Iterator(self.make(value) for value in obj.value),
+                "__repr__": lambda obj: "range({}, {}, {})".format(obj.value.start, obj.value.stop, obj.value.step)
+            },
+            "Iterator":{
+                "__iter__~": lambda obj: obj,
+                "__next__~": lambda obj: next(obj.value, self.builtins["StopIteration"])
             }
         }
 
         #doesn't really need to be a function, since we use it only once,
         #but the alternative is to have rather ugly binding workarounds for `host_func` in the loop
         def register_method(type, method_name, host_func):
-            if method_name.endswith("~"):
+            returns_host_value = not method_name.endswith("~")
+            if not returns_host_value:
                 method_name = method_name.rstrip("~")
                 func = lambda scopes, *args: host_func(*args)
             else:
                 func = lambda scopes, *args: self.make(host_func(*args))
             #we don't have to supply argument names to `make_Function` here, because external code never uses the `arguments` attribute during evaluation
             native_func = self.make_Function(func)
-            self.builtins[type]["private"]["instance_methods"][method_name] = native_func
+            #kept so that execution engines can call the host function directly. See eval_ast.OperatorSite.
+            if returns_host_value:
+                native_func.data["host_func"] = host_func
+            self.builtins[type].data["instance_methods"][method_name] = native_func
+            self.invalidate_method_tables()
 
         for type, methods in instance_methods.items():
             for method_name, host_func in methods.items():
@@ -104,37 +587,37 @@ class ObjectFactory:
 
     def init_builtin_funcs(self):
         def print_(scopes, obj):
-            #import pdb; pdb.set_trace()
-            method = self.get_attribute(obj, "__repr__")
-            assert method, "{} object has no method __repr__".format(self.get_type_name(obj))
-            result = self.eval_func(method, scopes, [])
-            assert self.get_type_name(result) == "String", "expected repr to return String, got {}".format(self.get_type_name(result))
-            print(result["private"]["value"])
+            print(self.host_repr(obj, scopes))
             return self.builtins["None"]
         #primarily used by the REPL. Prints everything but `None`.
         def print_single(scopes, obj):
-            if obj == self.builtins["None"]:
+            if obj is self.builtins["None"]:
                 return self.builtins["None"]
             else:
                 return print_(scopes, obj)
         #used to edit the values in a type's `instance_methods` collection, which is otherwise inaccessible.
         def override_method(scopes, type, method_name, func):
-            if "instance_methods" not in type["private"]:
+            if type.data is None or "instance_methods" not in type.data:
                 #maybe we should raise an exception here?
                 raise Exception("`type` parameter is not a type")
-            method_name = method_name["private"]["value"]
-            type["private"]["instance_methods"][method_name] = func
+            type.data["instance_methods"][method_name.value] = func
+            self.invalidate_method_tables()
             return self.builtins["None"]
+        #range(stop), range(start, stop), or range(start, stop, step). Its items are made as they're needed.
+        def range_(scopes, *args):
+            assert 1 <= len(args) <= 3, "expected 1 to 3 arguments for range, got {}".format(len(args))
+            return self.make_Range(*[arg.value for arg in args])
         self.builtins["print"] = self.make_Function(print_)
         self.builtins["print_single"] = self.make_Function(print_single)
         self.builtins["override_method"] = self.make_Function(override_method)
+        self.builtins["range"] = self.make_Function(range_)
 
     #functions of the form make_*** are used by the host language to construct
     #object instances without having to invoke their type's `__call__` method.
 
-    #creates a nested dict which acts as the basis of all actual KS objects.
+    #creates an object with no type, which acts as the basis of all actual KS objects.
     def make_blank(self):
-        return {"public": {}, "private": {}}
+        return KObject()
 
     #creates an object of a given type.
     #argument may be the string name of the type, if it is a built-in type;
@@ -142,9 +625,7 @@ class ObjectFactory:
     def make_Object(self, type_):
         if isinstance(type_, str):
             type_ = self.builtins[type_]
-        ret = self.make_blank()
-        ret["public"]["type"] = type_
-        return ret
+        return KObject(type_)
 
     """
     Creates a function object.
@@ -152,29 +633,82 @@ class ObjectFactory:
       if it is a host-language callable, its argument should be `closure`, and the remaining arguments should match the ones found in `arguments`.
     `closure` should be a sequence of string:object dicts.
     `arguments` should be a sequence of strings.
+    `executor` is optional. Execution engines other than eval_ast use it to run the functions they create.
+      it should have arguments (func, argument_values).
     """
-    def make_Function(self, body, arguments=None, closure=None):
+    def make_Function(self, body, arguments=None, closure=None, executor=None):
         ret = self.make_Object("Function")
         if arguments is None:
             arguments = []
         if closure is None:
             closure = []
         assert all(isinstance(arg, str) for arg in arguments), "expected str, got {} instead".format(set(type(arg) for arg in arguments))
-        ret["private"]["closure"] = closure
-        ret["private"]["arguments"] = arguments
-        ret["private"]["body"] = body
+        ret.data = {"closure": closure, "arguments": arguments, "body": body}
+        if executor is not None:
+            ret.data["executor"] = executor
         return ret
 
+    #creates an Iterator, which yields the items of `host_iterator`. They should already be KS objects.
+    def make_Iterator(self, host_iterator):
+        return KObject(self.builtins["Iterator"], iter(host_iterator))
+
+    #creates a Generator. `host_generator` should be a host generator that runs the body of a generator function, or a generator comprehension, and yields KS objects.
+    def make_Generator(self, host_generator):
+        return KObject(self.builtins["Generator"], host_generator)
+
+    #creates a Dict. `pairs` should be a sequence of (key, value) pairs of KS objects.
+    def make_Dict(self, pairs=()):
+        entries = {}
+        for key, value in pairs:
+            entries[self.dict_key(key)] = (key, value)
+        return KObject(self.builtins["Dict"], entries)
+
+    """
+    returns the key a Dict's host dict uses for the KS object `key`.
+    Integers and Strings use their host value, so looking them up doesn't call any KS code.
+    Objects with a `__hash__` method are wrapped in a HashedKey, and other objects are compared by identity.
+    """
+    def dict_key(self, key):
+        type = key.type
+        if type is self.builtins["Integer"] or type is self.builtins["String"]:
+            return key.value
+        if self.has_attribute(key, "__hash__"):
+            return HashedKey(self, key)
+        return key
+
+    #creates an IntArray holding the ints in the host iterable `values`.
+    def make_IntArray(self, values):
+        return KObject(self.builtins["IntArray"], memoryview(make_int_array(values)))
+
+    #creates a String holding `source[start:stop]`. Long slices are SliceStrings, which don't copy their characters until they're needed.
+    def make_String_slice(self, source, start, stop):
+        if stop - start < slice_string_min_length:
+            return KObject(self.builtins["String"], source[start:stop])
+        return SliceString(self.builtins["String"], source, start, stop)
+
+    #creates a Range. Takes the same arguments as Python's `range`.
+    def make_Range(self, *args):
+        return KObject(self.builtins["Range"], range(*args))
+
     """
     turns a Python object into its equivalent KevinScript object.
     Works on built-in scalar types and most collections.
     Use `make_Function` for functions.
     """
     def make(self, value):
+        #checked first, since arithmetic makes more Integers than anything else.
+        #bools are ints too, so this uses `type` rather than `isinstance`.
+        if type(value) is int:
+            if small_int_min <= value <= small_int_max:
+                return self.small_ints[value - small_int_min]
+            return KObject(self.builtins["Integer"], value)
+
+        #native methods may already have made the object, ex. String's `__add__`.
+        if isinstance(value, KObject):
+            return value
+
         if isinstance(value, list):
-            obj = self.make_Object("List")
-            obj["private"]["items"] = value
-            return obj
+            return KObject(self.builtins["List"], items=value)
 
         if isinstance(value, bool):
             return self.builtins["True" if value else "False"]
@@ -182,51 +716,139 @@ class ObjectFactory:
         if value is None:
             return self.builtins["None"]
 
-        #some types are just simple wrappers around host objects, with the value stored in the private dict.
+        #some types are just simple wrappers around host objects, with the value stored in the `value` slot.
         d = {str: "String", int: "Integer"}
         for host_type, native_type in d.items():
             if isinstance(value, host_type):
-                obj = self.make_Object(native_type)
-                obj["private"]["value"] = value
-                return obj
+                return KObject(self.builtins[native_type], value)
 
         raise Exception("No conversion found for type {}".format(type(value)))
 
-    def get_attribute(self, obj, name):
-        def iter_types(type):
-            while True:
-                yield type
-                next = type["public"]["parent"]
-                if next is self.builtins["None"]: break
-                type = next
-
-        """
-        creates a version of `func` that already has `obj` bound to the first argument.
-        """
-        def create_bound_method(func, obj):
-            arg_names = func["private"]["arguments"]
-            body = lambda closure, *args: self.eval_func(func, None, (obj,) + args)
-            return self.make_Function(body, arg_names[1:])
+    def iter_types(self, type):
+        while True:
+            yield type
+            next = type.attributes["parent"]
+            if next is self.builtins["None"]: break
+            type = next
 
+    """
+    creates a version of `func` that already has `obj` bound to the first argument.
+    The original function and object are kept, so execution engines can call the function directly.
+    """
+    def create_bound_method(self, func, obj):
+        arg_names = func.data["arguments"]
+        body = lambda closure, *args: self.eval_func(func, None, (obj,) + args)
+        ret = self.make_Function(body, arg_names[1:])
+        ret.data["bound_function"] = func
+        ret.data["bound_self"] = obj
+        return ret
+
+    """
+    looks up an attribute without creating a bound method for it.
+    returns a (value, is_method) pair. If `is_method` is True, `value` is an instance method, which expects `obj` as its first argument.
+    returns (None, False) if the attribute doesn't exist.
+    """
+    def find_attribute(self, obj, name):
         #see if the attribute is directly on the object
-        if name in obj["public"]:
-            return obj["public"][name]
+        attributes = obj.attributes
+        if attributes is not None and name in attributes:
+            return attributes[name], False
+        if name == "type":
+            return obj.type, False
 
         #see if the attribute is an instance method on the object's type chain
-        for type in iter_types(obj["public"]["type"]):
-            if "instance_methods" not in type["private"]:
-                #this should only happen for poorly implemented built-in types
-                raise Exception("type {} has no `instance_methods` collection".format(type["private"]["name"]))
-            func = type["private"]["instance_methods"].get(name)
-            if not func: continue
-            return create_bound_method(func, obj)
+        func = self.get_method_table(obj.type).get(name)
+        if func is not None:
+            return func, True
 
         #Couldn't find the attribute!
-        return None
+        return None, False
+
+    """
+    returns a dict of every instance method available to instances of `type`, including inherited ones.
+    The dict is built the first time it's needed, and kept until the methods or parent of any type change.
+    """
+    def get_method_table(self, type):
+        data = type.data
+        if data is not None and data.get("method_table_version") == self.method_table_version:
+            return data["method_table"]
+        table = {}
+        #start at the root of the type chain, so that each type's methods replace the ones it inherits.
+        for ancestor in reversed(list(self.iter_types(type))):
+            if ancestor.data is None or "instance_methods" not in ancestor.data:
+                #this should only happen for poorly implemented built-in types
+                raise Exception("type {} has no `instance_methods` collection".format(self.get_type_name(ancestor)))
+            table.update(ancestor.data["instance_methods"])
+        type.data["method_table"] = table
+        type.data["method_table_version"] = self.method_table_version
+        return table
+
+    #must be called whenever a type's `instance_methods` or `parent` changes.
+    def invalidate_method_tables(self):
+        self.method_table_version += 1
+
+    #assigns to a public attribute of `obj`.
+    def set_attribute(self, obj, name, value):
+        #common Integers and literals are shared by everything that uses them, see `make` and `eval_ast.make_literal`, so attributes set on one would appear on all of them.
+        assert obj.type is not self.builtins["Integer"] and obj.type is not self.builtins["String"], "can't set attributes of {}".format(self.get_type_name(obj))
+        if name == "type":
+            obj.type = value
+            return
+        if obj.attributes is None:
+            obj.attributes = {}
+        obj.attributes[name] = value
+        #reassigning a type's parent changes which methods its instances inherit.
+        #other objects' parents don't affect any method table, ex. `self.parent = node` in a tree.
+        if name == "parent" and obj.data is not None and "instance_methods" in obj.data:
+            self.invalidate_method_tables()
+
+    #returns the attribute as a first-class value. Instance methods are bound to `obj`.
+    def get_attribute(self, obj, name):
+        attr, is_method = self.find_attribute(obj, name)
+        if is_method:
+            return self.create_bound_method(attr, obj)
+        return attr
 
     def has_attribute(self, obj, name):
-        return self.get_attribute(obj, name) is not None
+        return self.find_attribute(obj, name)[0] is not None
+
+    #calls the method `name` of `obj`.
+    #instance methods are called directly with `obj` as their first argument, so no bound method is created.
+    def call_method(self, obj, name, argument_values, scopes=None):
+        func, is_method = self.find_attribute(obj, name)
+        assert func, "object {} has no method {}".format(self.get_type_name(obj), name)
+        if is_method:
+            argument_values = [obj] + list(argument_values)
+        return self.eval_func(func, scopes, argument_values)
+
+    #calls a KS callable from host code. Objects with a `__call__` method can be called as well as Functions.
+    def call_function(self, func, argument_values, scopes=None):
+        if func.data is None or "body" not in func.data:
+            return self.call_method(func, "__call__", argument_values, scopes)
+        return self.eval_func(func, scopes, argument_values)
+
+    #returns True if every object in `objs` is an instance of the builtin type named `type_name`.
+    def same_builtin_type(self, objs, type_name):
+        type = self.builtins[type_name]
+        return all(obj.type is type for obj in objs)
+
+    #returns True if `a == b`. Integers and Strings are compared by value without calling any KS code.
+    def equals(self, a, b):
+        if a is b:
+            return True
+        if a.type is b.type and (a.type is self.builtins["Integer"] or a.type is self.builtins["String"]):
+            return a.value == b.value
+        if not self.has_attribute(a, "__eq__"):
+            return False
+        return self.call_method(a, "__eq__", [b]) is self.builtins["True"]
+
+    #returns the host str of `obj`'s `__repr__`.
+    def host_repr(self, obj, scopes=None):
+        assert self.has_attribute(obj, "__repr__"), "{} object has no method __repr__".format(self.get_type_name(obj))
+        result = self.call_method(obj, "__repr__", [], scopes)
+        assert self.get_type_name(result) == "String", "expected repr to return String, got {}".format(self.get_type_name(result))
+        return result.value
 
     @staticmethod
     def get_type_name(obj):
-        return obj["public"]["type"]["private"]["name"]
+        return obj.type.data["name"]
@@ -0,0 +1,133 @@
+#optimizer.py - rewrites a program's syntax tree into an equivalent one that's quicker to evaluate.
+#It runs once per program, after `ks.compile` and before the program is executed.
+#Every execution engine can run both optimized and unoptimized trees.
+#
+#It makes three kinds of change:
+#  - chains of nodes that only pass their single child forward, ex. Expression -> BinOpExpression -> ... -> Atom -> Literal -> number,
+#    are replaced by the innermost node.
+#  - syntactic sugar that the engines would otherwise rebuild every time it's evaluated is rewritten once:
+#    function statements become assignments of function expressions, class statements become `Type(...)` calls,
+#    and subscripts become `__getitem__` and `__setitem__` method calls.
+#  - arithmetic on Integer literals, and concatenation of String literals, is replaced by its result.
+#    Programs can override the operator methods at any time, so the result is wrapped in a FoldedConstant node, which keeps the original expression.
+#    The engines only use the result while `eval_ast.operators_are_native()` says the native methods are still in place.
+
+import operator
+
+from ks.eval_ast import NodeConstructor, binary_operator_nodes, operators_are_native, pass_through_nodes
+from ks.parser import ast
+
+#the operations constant folding may perform on literals of each kind, keyed by operator.
+#comparisons aren't folded, since their results aren't literals.
+integer_operations = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mul": operator.mul,
+    "div": operator.floordiv,
+    "mod": operator.mod,
+}
+string_operations = {
+    "add": operator.add,
+}
+
+
+#returns the literal Leaf that a node stands for, or None if it isn't a literal or a folded constant.
+def literal_leaf(node):
+    if isinstance(node, ast.Leaf):
+        return node
+    if node.klass == "FoldedConstant":
+        return node.children[0]
+    return None
+
+
+def is_literal(node, kind):
+    leaf = literal_leaf(node)
+    return leaf is not None and leaf.token.klass.name == kind
+
+
+#returns a FoldedConstant node, which stands for `original` and holds its value as a literal Leaf positioned at `token`.
+def make_folded_constant(original, token, kind, value):
+    token = token.copy()
+    if kind == "number":
+        token.value = str(value)
+    else:
+        token.value = '"' + value + '"'
+    return ast.Node("FoldedConstant", [ast.Leaf(token), original])
+
+
+#returns the folded form of a binary operator node whose operands have already been optimized, or the node itself if it can't be folded.
+def fold_binary(node):
+    left, operator_node, right = node.children
+    operator_name = operator_node.children[0].klass
+    if is_literal(left, "number") and is_literal(right, "number"):
+        operation = integer_operations.get(operator_name)
+        left, right = literal_leaf(left), literal_leaf(right)
+        left_value, right_value = int(left.token.value), int(right.token.value)
+        #division by zero is left for the program to report when it runs.
+        if operation is None or (operator_name in ("div", "mod") and right_value == 0):
+            return node
+        return make_folded_constant(node, left.token, "number", operation(left_value, right_value))
+    if is_literal(left, "string_literal") and is_literal(right, "string_literal"):
+        operation = string_operations.get(operator_name)
+        if operation is None:
+            return node
+        left, right = literal_leaf(left), literal_leaf(right)
+        return make_folded_constant(node, left.token, "string_literal", operation(left.token.value[1:-1], right.token.value[1:-1]))
+    return node
+
+
+def fold_unary(node):
+    operator_node, operand = node.children
+    if is_literal(operand, "number"):
+        leaf = literal_leaf(operand)
+        value = int(leaf.token.value)
+        return make_folded_constant(node, leaf.token, "number", -value if operator_node.children[0].klass == "neg" else value)
+    return node
+
+
+def visit(node, fold):
+    if isinstance(node, ast.Leaf):
+        return node
+    klass = node.klass
+    children = node.children
+
+    if klass in pass_through_nodes:
+        return visit(children[0], fold)
+    if (klass in binary_operator_nodes or klass == "UnaryOpExpression") and len(children) == 1:
+        return visit(children[0], fold)
+
+    # desugaring. see the corresponding blocks of eval_ast.evaluate.
+    if klass == "FunctionDeclarationStatement":
+        func = ast.Node("FunctionDeclaration", children[1:])
+        return visit(ast.Node("AssignmentStatement", [children[0], func]), fold)
+    if klass == "ClassDeclarationStatement":
+        header = children[0]
+        class_name = header.children[0].token
+        parent_name = header.children[1].token if len(header.children) > 1 else None
+        function_names, function_nodes = [], []
+        if len(children) > 1:
+            for declaration_statement in children[-1].children:
+                function_names.append(declaration_statement.children[0].token)
+                function_nodes.append(ast.Node("FunctionDeclaration", declaration_statement.children[1:]))
+        #make_type_call_node returns a Statement, but this node is already inside one.
+        statement = NodeConstructor.make_type_call_node(class_name, parent_name, function_names, function_nodes)
+        return visit(statement.children[0], fold)
+    if klass == "AssignmentStatement" and not isinstance(children[0], ast.Leaf) and children[0].klass == "Subscript":
+        lhs, expression_node = children
+        call = NodeConstructor.make_method_call_expression_node(lhs.children[0], "__setitem__", [lhs.children[1], expression_node])
+        return visit(ast.Node("ExpressionStatement", [call]), fold)
+    if klass == "Subscript":
+        return visit(NodeConstructor.make_method_call_expression_node(children[0], "__getitem__", [children[1]]), fold)
+
+    node = ast.Node(klass, [visit(child, fold) for child in children])
+    if fold and klass in binary_operator_nodes:
+        return fold_binary(node)
+    if fold and klass == "UnaryOpExpression":
+        return fold_unary(node)
+    return node
+
+
+#returns an optimized copy of a program's tree. Leaves are shared with the original.
+def optimize(tree):
+    #if the operators have already been overridden, folded constants would never be used, so there's no point making them.
+    return visit(tree, operators_are_native())
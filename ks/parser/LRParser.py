@@ -1,6 +1,7 @@
 # LRParser: see http://en.wikipedia.org/wiki/LR_parser
 # takes a action+goto table and generates a rightmost derivation of a string within the language family.
 
+from ks.parser.densetable import no_action
 from ks.parser.lex import LiteralTokenRule, Token
 from ks.parser.parseRules import *
 from ks.parser.parserExceptions import NoActionFoundError
@@ -9,51 +10,88 @@ end_of_input_token = Token(LiteralTokenRule("$"), "$")
 
 
 # rules is a list of Rule objects.
-# actions is a dict whose key is a tuple of state and input symbol (int and string), and whose value is an Action object.
-# gotos is a dict whose key is a tuple of state(int) and non_terminal, and whose value is a state(int).
+# table is a DenseTable, containing the action and goto tables packed into integer arrays.
 class LRParser:
-    def __init__(self, rules, actions, gotos):
+    def __init__(self, rules, table):
         self.rules = rules
-        self.actions = actions
-        self.gotos = gotos
+        self.table = table
+
+    # returns the integer id of the token's terminal symbol, or None if the grammar has no such terminal.
+    # tokens produced by a lexer that knows the table's ids already carry it in `symbol_id`.
+    def symbol_id(self, token):
+        if token.symbol_id is not None:
+            return token.symbol_id
+        return self.table.terminal_ids.get(token.klass.name)
+
+    # returns the rightmost derivation of the input, as a list of rule indices.
+    def parse(self, input):
+        output = []
+
+        def record_reduction(rule_idx, values):
+            output.append(rule_idx)
+
+        self.build(input, lambda token: None, record_reduction)
+        return output
 
     # see:
     # http://en.wikipedia.org/wiki/LR_parser
     # "Architecture of LR parsers"
-    def parse(self, input):
-        self.stack = [0]
-        self.input = input + [end_of_input_token]
-        self.output = []
+    # `input` may be any iterable of tokens, including a generator. It is consumed exactly once.
+    # all parsing state lives in local variables, so one parser can be used by several threads at once.
+    # alongside the state stack, a value stack holds whatever the callbacks return:
+    #   make_leaf(token) is called when a token is shifted.
+    #   make_node(rule_idx, values) is called when reducing by a rule, with the values of the rule's right hand side.
+    # returns the value built for the start symbol.
+    def build(self, input, make_leaf, make_node):
+        actions = self.table.actions
+        gotos = self.table.gotos
+        terminal_count = self.table.terminal_count
+        nonterminal_count = self.table.nonterminal_count
+        rule_lhs = self.table.rule_lhs
+        rule_sizes = self.table.rule_sizes
+
+        tokens = iter(input)
+        stack = [0]
+        values = []
+        token = next(tokens, end_of_input_token)
         while True:
-            action_key = (self.stack[-1], self.input[0].klass.name)
+            symbol = token.symbol_id
+            if symbol is None:
+                symbol = self.symbol_id(token)
 
             # no action: syntax error is reported
-            if action_key not in self.actions:
-                raise NoActionFoundError(self.input[0])
-            action = self.actions[action_key]
-
-            # an accept: string is accepted
-            if action.action == accept:
-                return self.output
+            if symbol is None:
+                raise NoActionFoundError(token)
+            action = actions[stack[-1] * terminal_count + symbol]
+            if action == no_action:
+                raise NoActionFoundError(token)
 
             # a shift sn:
             # the current terminal is removed from the input stream
             # the state n is pushed onto the stack and becomes the current state.
-            if action.action == shift:
-                self.input = self.input[1:]
-                self.stack.append(action.destination)
+            if action > 0:
+                stack.append(action - 1)
+                values.append(make_leaf(token))
+                token = next(tokens, end_of_input_token)
 
             # a reduce rm:
             # the number m is written to the output stream
             # for every symbol in the RHS of rule m, a state is removed from the stack.
             # given the state that is then on top of the stack and the left-hand side of rule,
             # a new state is looked up in the goto table and made the new current state by pushing it onto the stack.
-            if action.action == reduce:
-                self.output.append(action.destination)
-                rule_idx = action.destination
-                amt_to_pop = len(self.rules[rule_idx].RHS)
-                self.stack = self.stack[0:-amt_to_pop]
-                goto_key = (self.stack[-1], self.rules[rule_idx].LHS)
-                if goto_key not in self.gotos:
+            else:
+                rule_idx = -action - 1
+                # an accept: string is accepted.
+                # (reducing by the start rule is how the packed table represents accepting.)
+                if rule_idx == 0:
+                    return values[-1] if values else None
+                start = len(stack) - rule_sizes[rule_idx]
+                del stack[start:]
+                # the value stack is one shorter than the state stack, which also holds the initial state.
+                node = make_node(rule_idx, values[start-1:])
+                del values[start-1:]
+                values.append(node)
+                target = gotos[stack[-1] * nonterminal_count + rule_lhs[rule_idx]]
+                if target == -1:
                     raise Exception("couldn't parse string - no goto found")
-                self.stack.append(self.gotos[goto_key])
+                stack.append(target)
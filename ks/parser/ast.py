@@ -1,6 +1,7 @@
-from ks.parser.lex import LiteralTokenRule, gen_token_rules, lex
+from ks.parser import tablecache
+from ks.parser.lex import LiteralTokenRule, Scanner, gen_token_rules
 from ks.parser.parseRules import parse_rules
-from ks.parser.util import construct_parser
+from ks.parser.util import get_parser
 
 
 def slurp(filename):
@@ -132,14 +133,19 @@ def reduce_tail_recursive_nodes(tree, klass):
                 last_child = node.children[-1]
 
 
-def get_compiler(tokens_filename, rules_filename, reducible_node_names=None):
+def get_compiler(tokens_filename, rules_filename, reducible_node_names=None, single_pass=False):
     """Creates a callable which can be used to construct abstract syntax trees for the given program.
     arguments:
         tokens_filename - the filename of the file which contains the regexes that match literal token values.
         rules_filename  - the filename of the file which contains the language rules in Backus Naur Form.
         reducible_node_names - optional. a list of strings, indicating which tail-recursive nodes should be reduced. See `reduce_tail_recursive_nodes` for more information.
+        single_pass - optional. if True, the parser builds the tree as it reduces, dropping literal tokens and reducing tail-recursive nodes as it goes,
+            instead of producing a derivation that is turned into a tree afterwards. The resulting tree is the same either way.
     returns:
         function construct_ast(program_text), which returns the root Node of the constructed ast.
+        It has two attributes: `token_rules`, a dict of the lexer's TokenRules keyed by name,
+        and `key`, a string that changes whenever the grammar or the reducible nodes change.
+    The parse tables are cached on disk (see tablecache.py), keyed by the contents of both files.
     """
     if not reducible_node_names:
         reducible_node_names = []
@@ -148,15 +154,53 @@ def get_compiler(tokens_filename, rules_filename, reducible_node_names=None):
 
     lex_text = slurp(tokens_filename)
     token_rules = gen_token_rules(lex_text, rules)
-
-    parser = construct_parser(rules_text)
+    scanner = Scanner(token_rules)
+
+    parser = get_parser(rules_text)
+    for token_rule in token_rules:
+        token_rule.symbol_id = parser.table.terminal_ids.get(token_rule.name)
+
+    rule_names = [rule.LHS.value for rule in rules]
+    reducible = set(reducible_node_names)
+
+    # callbacks for `LRParser.build`, used when `single_pass` is set.
+    def make_leaf(token):
+        if isinstance(token.klass, LiteralTokenRule):
+            return None
+        return Leaf(token)
+
+    # reducible nodes keep their children in reverse order until the tree is finished, see `unreverse`.
+    # the last child was reduced before this node was, so it has already absorbed any nodes nested inside it,
+    # and the new children can be appended to its list rather than copying the whole list on every reduction.
+    def make_node(rule_idx, values):
+        klass = rule_names[rule_idx]
+        children = [value for value in values if value is not None]
+        if klass not in reducible:
+            return Node(klass, children)
+        if children and not is_leaf(children[-1]) and children[-1].klass == klass:
+            nested = children.pop()
+            nested.children.extend(reversed(children))
+            return nested
+        children.reverse()
+        return Node(klass, children)
+
+    # puts the children of every reducible node built by `make_node` back in order, in one pass over the finished tree.
+    def unreverse(tree):
+        if reducible:
+            for node in iter_tree(tree):
+                if not is_leaf(node) and node.klass in reducible:
+                    node.children.reverse()
+        return tree
 
     def construct_ast(program_text):
-        tokens = lex(program_text, token_rules)
+        tokens = scanner.lex(program_text)
 
         # todo: this kind of post-lexing processing should be specified by the caller somehow.
         tokens = [token for token in tokens if token.klass.name != "whitespace"]
 
+        if single_pass:
+            return unreverse(parser.build(tokens, make_leaf, make_node))
+
         right_derivation = parser.parse(tokens)
 
         parse_tree = construct_parse_tree(right_derivation, rules, tokens)
@@ -166,4 +210,6 @@ def get_compiler(tokens_filename, rules_filename, reducible_node_names=None):
             reduce_tail_recursive_nodes(parse_tree, name)
         return parse_tree
 
+    construct_ast.token_rules = dict((rule.name, rule) for rule in token_rules)
+    construct_ast.key = tablecache.grammar_key(rules_text, lex_text, " ".join(reducible_node_names))
     return construct_ast
@@ -0,0 +1,57 @@
+# densetable.py - packs the dict-based action and goto tables produced by SLRtable.py into flat integer arrays.
+# Terminals and nonterminals are each numbered from zero, so the LR parser can find any cell with a single integer index
+# instead of hashing a (state, symbol) tuple.
+
+from array import array
+
+from ks.parser.primitives import *
+
+# action cells are packed into a single int:
+#   0      - no action. The input is a syntax error.
+#   n > 0  - shift, then go to state n-1.
+#   n < 0  - reduce by rule -n-1. Reducing by rule 0, the start rule, means the input was accepted.
+# LRParser.build decodes the cells itself, inline, since it reads one for every token.
+no_action = 0
+accept_action = -1
+
+
+def pack_action(action):
+    if action.action == shift:
+        return action.destination + 1
+    if action.action == reduce:
+        return -(action.destination + 1)
+    return accept_action
+
+
+class DenseTable:
+    """
+    arguments:
+        rules - the list of Rule objects the tables were generated from.
+        actions - a dict whose key is a tuple of state and terminal name, and whose value is an Action object.
+        gotos - a dict whose key is a tuple of state and NonTerminal, and whose value is a state.
+    """
+    def __init__(self, rules, actions, gotos):
+        terminal_names = set(name for state, name in actions)
+        terminal_names.update(symbol.value for rule in rules for symbol in rule.RHS if symbol.symbol_type == Terminal.symbol_type)
+        terminal_names.add("$")
+        self.terminal_ids = dict((name, idx) for idx, name in enumerate(sorted(terminal_names)))
+
+        nonterminal_names = sorted(set(rule.LHS.value for rule in rules))
+        self.nonterminal_ids = dict((name, idx) for idx, name in enumerate(nonterminal_names))
+
+        self.state_count = 1 + max([state for state, name in actions] + [state for state, symbol in gotos] + [target for target in gotos.values()])
+        self.terminal_count = len(self.terminal_ids)
+        self.nonterminal_count = len(self.nonterminal_ids)
+
+        # row-major. The cell for state s and symbol x is at `s * <symbol count> + x`.
+        self.actions = array("i", [no_action]) * (self.state_count * self.terminal_count)
+        for (state, name), action in actions.items():
+            self.actions[state * self.terminal_count + self.terminal_ids[name]] = pack_action(action)
+
+        self.gotos = array("i", [-1]) * (self.state_count * self.nonterminal_count)
+        for (state, symbol), target in gotos.items():
+            self.gotos[state * self.nonterminal_count + self.nonterminal_ids[symbol.value]] = target
+
+        # the information the parser needs about each rule when reducing by it.
+        self.rule_lhs = array("i", [self.nonterminal_ids[rule.LHS.value] for rule in rules])
+        self.rule_sizes = array("i", [len(rule.RHS) for rule in rules])
@@ -3,6 +3,8 @@ import re
 
 # subclasses should implement:
 # attribute `self.name`
+# attribute `self.pattern`, a regex string matching the same text that `self.match` does. Used by `Scanner`.
+# attribute `self.symbol_id`, the integer id of the parser's terminal with the same name, or None if it isn't known. See `DenseTable`.
 # method `self.match(s:str)`, which returns either `None` if the string does not match, or the length of the slice of the string that matches.
 class TokenRule:
     pass
@@ -13,6 +15,8 @@ class RegexTokenRule(TokenRule):
         self.name = name
         self.regex_text = regex
         self.regex = re.compile(regex)
+        self.pattern = regex
+        self.symbol_id = None
 
     def match(self, s):
         result = self.regex.match(s)
@@ -27,6 +31,8 @@ class RegexTokenRule(TokenRule):
 class LiteralTokenRule(TokenRule):
     def __init__(self, name):
         self.name = name
+        self.pattern = re.escape(name)
+        self.symbol_id = None
 
     def match(self, s):
         if s.startswith(self.name):
@@ -75,6 +81,8 @@ class Token:
         self.klass = klass
         self.value = value
         self.position = position
+        # copied from the token rule so the parser can index its tables without looking up the name.
+        self.symbol_id = getattr(klass, "symbol_id", None)
 
     def __repr__(self):
         return "Token({}, {}, {})".format(repr(self.klass.name), repr(self.value), self.position)
@@ -83,19 +91,58 @@ class Token:
         return Token(self.klass, self.value, self.position)
 
 
+# converts text into tokens using a single combined regex, instead of trying each rule separately at each position.
+# Follows the same rules as trying each rule in turn:
+# the longest match wins, and ties go to whichever rule comes first in `token_rules`.
+class Scanner:
+    def __init__(self, token_rules):
+        self.token_rules = token_rules
+        literals = [rule for rule in token_rules if isinstance(rule, LiteralTokenRule)]
+        others = [rule for rule in token_rules if not isinstance(rule, LiteralTokenRule)]
+        self.literals = dict((rule.name, rule) for rule in literals)
+
+        # each rule gets a group inside an optional lookahead, so one `match` call reports the length that every rule would match.
+        # all literals share one group. Listing them longest first makes the alternation find the longest one.
+        # (two different literals can't match the same text at the same length, so literals never tie with each other.)
+        groups = []
+        if literals:
+            alternatives = [rule.pattern for rule in sorted(literals, key=lambda rule: -len(rule.name))]
+            groups.append("(?:(?=(?P<literal>{})))?".format("|".join(alternatives)))
+        for idx, rule in enumerate(others):
+            groups.append("(?:(?=(?P<rule{}>{})))?".format(idx, rule.pattern))
+        self.regex = re.compile("".join(groups))
+
+        # (group index, rule) pairs in priority order. The literal group's rule is None, since it depends on the text matched.
+        self.groups = []
+        if literals:
+            self.groups.append((self.regex.groupindex["literal"], None))
+        for idx, rule in enumerate(others):
+            self.groups.append((self.regex.groupindex["rule{}".format(idx)], rule))
+
+    def lex(self, text):
+        regex_match = self.regex.match
+        groups = self.groups
+        literals = self.literals
+        tokens = []
+        idx = 0
+        line_number = 0
+        size = len(text)
+        while idx < size:
+            match = regex_match(text, idx)
+            best_end = idx
+            best_rule = None
+            for group, rule in groups:
+                end = match.end(group)
+                if end > best_end:
+                    best_end = end
+                    best_rule = rule if rule is not None else literals[match.group(group)]
+            assert best_end > idx, "Couldn't parse text at line {}, position {}: {}".format(line_number, idx, repr(text[idx:idx+20]))
+            literal = text[idx:best_end]
+            tokens.append(Token(best_rule, literal, (line_number+1, idx)))
+            idx = best_end
+            line_number += literal.count("\n")
+        return tokens
+
+
 def lex(text, token_rules):
-    idx = 0
-    line_number = 0
-    tokens = []
-    while len(text) > 0:
-        matches = [{"rule": rule, "size": rule.match(text)} for rule in token_rules]
-        matches = [match for match in matches if match["size"] and match["size"] > 0]
-        assert len(matches) > 0, "Couldn't parse text at line {}, position {}: {}".format(line_number, idx, repr(text[:20]))
-        match = max(matches, key=lambda m: m["size"])
-        size = match["size"]
-        literal = text[:size]
-        tokens.append(Token(match["rule"], literal, (line_number+1, idx)))
-        text = text[size:]
-        idx += size
-        line_number += literal.count("\n")
-    return tokens
+    return Scanner(token_rules).lex(text)
@@ -0,0 +1,82 @@
+# tablecache.py - saves generated parse tables to disk, so they don't have to be rebuilt from the grammar on every run.
+# cache files are keyed by a hash of the grammar text, so editing the grammar automatically invalidates them.
+
+import hashlib
+import os
+import pickle
+
+# bump this whenever the layout of the cached tables changes, so stale files from older versions are ignored.
+CACHE_VERSION = 2
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+
+# returns the directory where cache files should be stored, or None if caching is disabled.
+# set the environment variable KS_NO_CACHE to disable caching, or KS_CACHE_DIR to use a different directory.
+def get_cache_dir():
+    if os.environ.get("KS_NO_CACHE"):
+        return None
+    return os.environ.get("KS_CACHE_DIR") or default_cache_dir
+
+
+# returns a hex digest identifying the given texts, plus the cache version.
+def grammar_key(*texts):
+    digest = hashlib.sha1(str(CACHE_VERSION).encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_filename(key, cache_dir, extension=".tables"):
+    return os.path.join(cache_dir, key + extension)
+
+
+# returns the object stored under `key`, or None if there is no usable cache file.
+def load(key, cache_dir=None, extension=".tables"):
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+    try:
+        with open(cache_filename(key, cache_dir, extension), "rb") as file:
+            version, stored_key, value = pickle.load(file)
+    except Exception:
+        # missing, truncated, or written by an incompatible version. Either way, the caller will regenerate it.
+        return None
+    if version != CACHE_VERSION or stored_key != key:
+        return None
+    return value
+
+
+# stores `value` under `key`. Failing to write the cache is never fatal; we just pay the construction cost again next time.
+def save(key, value, cache_dir=None, extension=".tables"):
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return False
+    data = pickle.dumps((CACHE_VERSION, key, value), pickle.HIGHEST_PROTOCOL)
+    return write_atomically(cache_filename(key, cache_dir, extension), data)
+
+
+# writes `data` to a temporary file first and then renames it into place, so concurrent processes never see a half-written file.
+# returns True if the file was written.
+def write_atomically(filename, data):
+    # imported here because most runs only ever read the cache, and tempfile is slow to import.
+    import tempfile
+    directory = os.path.dirname(filename)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp_filename = tempfile.mkstemp(dir=directory)
+    except (IOError, OSError):
+        return False
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        getattr(os, "replace", os.rename)(temp_filename, filename)
+    except (IOError, OSError):
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        return False
+    return True
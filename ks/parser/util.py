@@ -1,3 +1,5 @@
+from ks.parser import tablecache
+from ks.parser.densetable import DenseTable
 from ks.parser.LRParser import LRParser
 from ks.parser.SLRtable import ParseTable
 from ks.parser.parseRules import parse_rules
@@ -17,15 +19,34 @@ def construct_parser(rules_text, is_verbose=False):
     table = ParseTable(rules)
     log(table)
 
-    parser = LRParser(rules, table.action_table(), table.goto_table())
+    parser = LRParser(rules, DenseTable(rules, table.action_table(), table.goto_table()))
+    return parser
+
+
+# parsers already built or loaded during this run, keyed by grammar key.
+_parsers = {}
+
+
+# like `construct_parser`, but reuses parse tables from earlier runs when the grammar hasn't changed.
+# the tables only depend on the rules, so every caller with the same rules, ex. `is_valid` and `ast.get_compiler`, shares one parser and one cache file.
+def get_parser(rules_text):
+    key = tablecache.grammar_key(rules_text)
+    if key in _parsers:
+        return _parsers[key]
+    rules = parse_rules(rules_text)
+    table = tablecache.load(key)
+    if table is None:
+        parse_table = ParseTable(rules)
+        table = DenseTable(rules, parse_table.action_table(), parse_table.goto_table())
+        tablecache.save(key, table)
+    parser = LRParser(rules, table)
+    _parsers[key] = parser
     return parser
 
 
 # returns True if the program is valid, False otherwise
 def is_valid(rules_text, program_text):
-    rules = parse_rules(rules_text)
-    table = ParseTable(rules)
-    parser = LRParser(rules, table.action_table(), table.goto_table())
+    parser = get_parser(rules_text)
     try:
         derivation = parser.parse(program_text)
     except:
@@ -0,0 +1,145 @@
+#resolver.py - works out, once, where each variable in a program lives, so the evaluator doesn't have to search for it by name.
+#
+#Every function body and every comprehension gets a Scope, listing the names bound directly inside it.
+#At run time, each Scope corresponds to a Frame (see eval_ast.py) whose values are stored in a list, one slot per name.
+#
+#After `resolve` runs:
+#  - the body node of every function, and every ListComp and GeneratorComp node, has a `scope` attribute.
+#  - the body node of every function has an `is_generator` attribute. See `contains_yield`.
+#  - every identifier Leaf that is read or assigned to has an `address` attribute. It is either
+#      (depth, slot) - the value is in slot `slot` of the frame `depth` levels out from the current one, or
+#      None - the name isn't bound by any enclosing function, so it's a global (or builtin) name.
+#
+#A local variable can be read before it's assigned, in which case KS falls back to the enclosing scopes.
+#The evaluator handles that at run time, using each Scope's `names` dict to search the outer frames by name.
+
+from ks.parser import ast
+
+
+class Scope:
+    def __init__(self):
+        #the slot index of each name bound in this scope.
+        self.names = {}
+
+    def declare(self, name):
+        if name not in self.names:
+            self.names[name] = len(self.names)
+
+    @property
+    def size(self):
+        return len(self.names)
+
+
+def is_identifier(node):
+    return isinstance(node, ast.Leaf) and node.token.klass.name == "identifier"
+
+
+#adds every name bound directly inside `node` to `scope`. Doesn't look inside nested functions, which have their own scopes.
+def declare_names(node, scope):
+    if isinstance(node, ast.Leaf):
+        return
+    klass = node.klass
+    if klass == "AssignmentStatement":
+        if isinstance(node.children[0], ast.Leaf):
+            scope.declare(node.children[0].token.value)
+    elif klass in ("FunctionDeclarationStatement", "ForStatement"):
+        scope.declare(node.children[0].token.value)
+    elif klass == "ClassDeclarationStatement":
+        scope.declare(node.children[0].children[0].token.value)
+        return
+    elif klass in ("FunctionDeclaration", "ListComp", "GeneratorComp"):
+        return
+    for child in node.children:
+        declare_names(child, scope)
+
+
+#returns True if the function body contains a `yield` statement, making the function a generator function.
+#yields inside nested functions belong to those functions, so they don't count.
+def contains_yield(node):
+    if isinstance(node, ast.Leaf):
+        return False
+    if node.klass == "YieldStatement":
+        return True
+    if node.klass in ("FunctionDeclaration", "FunctionDeclarationStatement", "ClassDeclarationStatement"):
+        return False
+    return any(contains_yield(child) for child in node.children)
+
+
+#returns the address of a name being read, given the enclosing scopes, innermost last.
+def read_address(name, scopes):
+    for depth, scope in enumerate(reversed(scopes)):
+        if name in scope.names:
+            return (depth, scope.names[name])
+    return None
+
+
+#returns the address of a name being assigned to. Assignment always binds in the innermost scope.
+def target_address(name, scopes):
+    if not scopes:
+        return None
+    return (0, scopes[-1].names[name])
+
+
+#resolves a function. `argument_list` is a FunctionDeclarationArgumentList node, or None if the function has no arguments.
+def resolve_function(argument_list, body, scopes):
+    scope = Scope()
+    if argument_list is not None:
+        for leaf in argument_list.children[0].children:
+            scope.declare(leaf.token.value)
+    declare_names(body, scope)
+    body.scope = scope
+    body.is_generator = contains_yield(body)
+    visit(body, scopes + [scope])
+
+
+def visit(node, scopes):
+    if isinstance(node, ast.Leaf):
+        if is_identifier(node):
+            node.address = read_address(node.token.value, scopes)
+        return
+    klass = node.klass
+    children = node.children
+    if klass == "AttributeRef":
+        # the attribute name isn't a variable
+        visit(children[0], scopes)
+    elif klass == "AssignmentStatement":
+        lhs = children[0]
+        if isinstance(lhs, ast.Leaf):
+            lhs.address = target_address(lhs.token.value, scopes)
+        else:
+            visit(lhs, scopes)
+        visit(children[1], scopes)
+    elif klass == "ForStatement":
+        children[0].address = target_address(children[0].token.value, scopes)
+        visit(children[1], scopes)
+        visit(children[2], scopes)
+    elif klass == "FunctionDeclarationStatement":
+        children[0].address = target_address(children[0].token.value, scopes)
+        resolve_function(children[1] if len(children) > 2 else None, children[-1], scopes)
+    elif klass == "FunctionDeclaration":
+        resolve_function(children[0] if len(children) > 1 else None, children[-1], scopes)
+    elif klass == "ClassDeclarationStatement":
+        header = children[0]
+        header.children[0].address = target_address(header.children[0].token.value, scopes)
+        if len(header.children) > 1:
+            visit(header.children[1], scopes)
+        if len(children) > 1:
+            # method names aren't variables; they become keys in the type's method list.
+            for declaration_statement in children[-1].children:
+                method_children = declaration_statement.children
+                resolve_function(method_children[1] if len(method_children) > 2 else None, method_children[-1], scopes)
+    elif klass in ("ListComp", "GeneratorComp"):
+        visit(children[2], scopes)
+        scope = Scope()
+        scope.declare(children[1].token.value)
+        node.scope = scope
+        visit(children[0], scopes + [scope])
+    else:
+        for child in children:
+            visit(child, scopes)
+
+
+#annotates a whole program. Its top level is the global scope, which isn't resolved to slots.
+def resolve(tree):
+    visit(tree, [])
+    return tree
@@ -1,21 +1,28 @@
+import os
+import shutil
+
 import ks
+from ks.parser import ast
 
 
+#every test runs once on each execution engine.
 def expect_runs(code):
-    try:
-        ks.execute(code)
-    except Exception as e:
-        print("Expected code {} to run successfully, got exception {} instead".format(repr(code), repr(str(e))))
-        raise
+    for engine in sorted(ks.engines):
+        try:
+            ks.execute(code, engine=engine)
+        except Exception as e:
+            print("Expected code {} to run successfully on the {} engine, got exception {} instead".format(repr(code), engine, repr(str(e))))
+            raise
 
 
 def expect_output(code, output):
-    try:
-        result = ks.check_output(code)
-    except Exception as e:
-        print("Expected code {} to produce output {}, got exception {} instead".format(repr(code), repr(output), repr(str(e))))
-        raise
-    assert result == output, "Expected code {} to produce output {}, got {} instead".format(repr(code), repr(output), repr(result))
+    for engine in sorted(ks.engines):
+        try:
+            result = ks.check_output(code, engine=engine)
+        except Exception as e:
+            print("Expected code {} to produce output {} on the {} engine, got exception {} instead".format(repr(code), repr(output), engine, repr(str(e))))
+            raise
+        assert result == output, "Expected code {} to produce output {} on the {} engine, got {} instead".format(repr(code), repr(output), engine, repr(result))
 
 
 expect_runs("")
@@ -25,9 +32,8 @@ expect_output('print("Hello, World!")', 'Hello, World!')
 expect_output('print(123)', '123')
 expect_output('print(True)', 'True')
 expect_output('print(False)', 'False')
-print("skipping tests for list output until support for native builtin methods is available")
-#expect_output('print [1, 2, 3]', '[1, 2, 3]')
-#expect_output('print [1, [2, [3]]]', '[1, [2, [3]]]')
+expect_output('print([1, 2, 3])', '[1, 2, 3]')
+expect_output('print([1, [2, [3]], None, True])', '[1, [2, [3]], None, True]')
 expect_output('print(None)', 'None')
 expect_output('print(Object)', "<type 'Object'>")
 
@@ -75,9 +81,45 @@ expect_output("print(True and False)", "False")
 expect_output("print(True or False)", "True")
 expect_runs("1 * 1 + 1 / 1 - 1 < 1")
 
+#`and` and `or` don't evaluate their right operand when a Boolean left operand decides the result
+expect_output("""
+    function check(name, result){ print(name); return result; }
+    class Flag{ function __and__(self, other){ return "custom and"; } }
+    print(False and check("a", True));
+    print(True or check("b", False));
+    print(True and check("c", False));
+    print(False or check("d", True));
+    print(check("e", False) and check("f", True) or check("g", True));
+    print(Flag() and check("h", True));
+""", "False\nTrue\nc\nFalse\nd\nTrue\ne\ng\nTrue\nh\ncustom and")
+
 #string concatenation
 expect_output("""print("Hello" + " " + "World")""", "Hello World")
 
+#string methods, including slices of long strings, which share their source's characters
+expect_output("""
+    t = "  alpha,beta,gamma  ".strip();
+    print([t.size(), t[0], t[-1], t.slice(6, 10), t.slice(-5), t.slice(3, 1), t.find("beta"), t.find("zeta"), t.find("a", 1)]);
+    print([t.split(","), "a b  c".split(), "-".join(t.split(",")), t.replace("a", "A")]);
+    print([t.startswith("alp"), t.endswith("ma"), "abc" < "abd", "b" > "a", "x" == "x", "x" == 1, [c for c in "hey"]]);
+    long = "";
+    for(i in range(100)){ long = long + "0123456789"; }
+    part = long.slice(5, 905);
+    inner = part.slice(100, -100);
+    print([part.size(), inner.size(), inner[0], inner[-1], inner.find("89"), inner.startswith("56"), inner.endswith("34"), inner.slice(0, 12)]);
+    print({part.slice(0, 3): "found"}["567"]);
+""", "[16, a, a, beta, gamma, , 6, -1, 4]\n[[alpha, beta, gamma], [a, b, c], alpha-beta-gamma, AlphA,betA,gAmmA]\n[True, True, True, True, True, False, [h, e, y]]\n[900, 700, 5, 4, 3, True, True, 567890123456]\nfound")
+
+#long strings built by concatenation share a builder, without changing the strings built before them
+expect_output("""
+    base = "";
+    for(i in range(100)){ base = base + "abc"; }
+    x = base + "x";
+    y = base + "y";
+    xx = x + "x";
+    print(y + x + xx + base);
+""", "abc" * 100 + "y" + "abc" * 100 + "x" + "abc" * 100 + "xx" + "abc" * 100)
+
 #builtin type instantiation
 expect_output("print(Object())", "<Object instance>")
 expect_output("print(Integer())", "0")
@@ -151,10 +193,382 @@ expect_output("""
     print(x.frob + x.durf());
 """, '4')
 
+#methods called directly and used as first-class values
+expect_output("""
+    class Adder{
+        function __init__(self){
+            self.total = 0;
+            self.scale = function(x){return x*10;};
+        }
+        function add(self, x){
+            self.total = self.total + x;
+            return self.total;
+        }
+        function __call__(self, x){
+            return self.add(x);
+        }
+    }
+    a = Adder();
+    a.add(1);
+    f = a.add;
+    f(2);
+    a(3);
+    print(a.scale(a.total));
+""", '60')
+
+#inherited methods see later changes to the type hierarchy
+expect_output("""
+    class A{ function name(self){ return "A"; } }
+    class B(A){}
+    class C{ function name(self){ return "C"; } }
+    b = B();
+    print(b.name());
+    override_method(A, "name", function(self){ return "A2"; });
+    print(b.name());
+    B.parent = C;
+    print(b.name());
+""", 'A\nA2\nC')
+
+#operators that have specialized to builtin types notice when the types or methods change
+integer_methods = ks.eval_ast.builtins["Integer"].data["instance_methods"]
+original_add = integer_methods["__add__"]
+for engine in sorted(ks.engines):
+    result = ks.check_output("""
+        function add(a, b){ return a + b; }
+        print(add(1, 2));
+        print(add("a", "b"));
+        print(add(1, 2));
+        override_method(Integer, "__add__", function(self, other){ return 42; });
+        print(add(1, 2));
+    """, engine=engine)
+    integer_methods["__add__"] = original_add
+    ks.eval_ast.object_factory.invalidate_method_tables()
+    assert result == "3\nab\n3\n42", "operator specialization failed on the {} engine, got {}".format(engine, repr(result))
+
+#bulk list methods, on builtin items and on items of user-defined types
+expect_output("""
+    class V{
+        function __init__(self, n){ self.n = n; }
+        function __lt__(self, other){ return self.n < other.n; }
+        function __gt__(self, other){ return self.n > other.n; }
+        function __add__(self, other){ return V(self.n + other.n); }
+        function __eq__(self, other){ return self.n == other.n; }
+    }
+    xs = [5, 3, 8, 1];
+    print([xs.map(function(x){ return x * 2; }), xs.filter(function(x){ return x > 2; })]);
+    print([xs.reduce(function(a, b){ return a - b; }), xs.reduce(function(a, b){ return a + b; }, 100)]);
+    print([xs.sum(), xs.min(), xs.max(), ["b", "c", "a"].max(), [].sum()]);
+    pairs = [[2, "b"], [1, "a"], [2, "c"], [0, "z"]];
+    pairs.sort(function(p){ return p[0]; });
+    xs.sort();
+    xs.extend([9, 0]);
+    print([pairs, xs, xs.slice(1, 3), xs.slice(-2)]);
+    print([xs.index(8), xs.index(42), xs.contains(9), xs.contains("9")]);
+    vs = [V(3), V(1), V(2)];
+    vs.sort();
+    print(vs.map(function(v){ return v.n; }));
+    print([vs.min().n, vs.max().n, vs.sum().n, vs.index(V(2)), vs.contains(V(4))]);
+""", "[[10, 6, 16, 2], [5, 3, 8]]\n[-7, 117]\n[17, 1, 8, c, 0]\n[[[0, z], [1, a], [2, b], [2, c]], [1, 3, 5, 8, 9, 0], [3, 5], [9, 0]]\n[3, -1, True, False]\n[1, 2, 3]\n[1, 3, 6, 1, False]")
+
+#IntArrays: element-wise operators, reductions, conversions, and slices that share the array's items
+expect_output("""
+    a = IntArray([1, 2, 3, 4]);
+    b = IntArray(range(10, 50, 10));
+    print([a + b, a * 2 + b, b / a, b % 3, a > IntArray([0, 5, 0, 5]), a == 2]);
+    print([(b - a).to_list(), a.sum(), a.min(), a.max(), a.dot(b)]);
+    view = b.slice(1, 3);
+    view[0] = 99;
+    copy = IntArray(b);
+    copy[0] = 0;
+    print([b, view, view.size(), b.slice(-1), copy]);
+    c = IntArray(3);
+    c[2] = 7;
+    print([x * 2 for x in c]);
+""", "[IntArray([11, 22, 33, 44]), IntArray([12, 24, 36, 48]), IntArray([10, 10, 10, 10]), IntArray([1, 2, 0, 1]), IntArray([1, 0, 1, 0]), IntArray([0, 1, 0, 0])]\n[[9, 18, 27, 36], 10, 1, 4, 300]\n[IntArray([10, 99, 30, 40]), IntArray([99, 30]), 2, IntArray([40]), IntArray([0, 99, 30, 40])]\n[0, 0, 14]")
+
+#IntArray items must fit in 64 bits
+for code in ["IntArray([2]) * 9223372036854775807;", "IntArray([9223372036854775808]);", "a = IntArray(1); a[0] = -9223372036854775809;"]:
+    for engine in sorted(ks.engines):
+        try:
+            ks.execute(code, engine=engine)
+        except AssertionError as e:
+            assert str(e) == "IntArray items must be between -9223372036854775808 and 9223372036854775807", "unexpected error from {} on the {} engine: {}".format(repr(code), engine, repr(str(e)))
+        else:
+            assert False, "expected {} to fail on the {} engine".format(repr(code), engine)
+expect_output("print(IntArray([9223372036854775807, -9223372036854775808]));", "IntArray([9223372036854775807, -9223372036854775808])")
+
 #list comprehension
 expect_runs("[x*2 for x in [1,2,3,4]]")
 
+#iteration protocol: lists, lazy ranges, and user defined iterators work with `for` loops and list comprehensions
+expect_output("""
+    class Countdown{
+        function __init__(self, n){ self.n = n; }
+        function __iter__(self){ return self; }
+        function __next__(self){
+            if (self.n == 0){ return StopIteration; }
+            self.n = self.n - 1;
+            return self.n + 1;
+        }
+    }
+    class Pair{
+        function size(self){ return 2; }
+        function __getitem__(self, i){ return i * 10; }
+    }
+    total = 0;
+    for(x in range(100000)){ total = total + 1; }
+    print(total);
+    print([x for x in range(10, 0, -3)]);
+    print([x * 2 for x in Countdown(3)]);
+    for(x in Pair()){ print(x); }
+    items = [1, 2];
+    for(x in items){ items.append(x); }
+    print(items);
+    print(range(5).size());
+""", "100000\n[10, 7, 4, 1]\n[6, 4, 2]\n0\n10\n[1, 2, 1, 2]\n5")
+
+#generator functions and generator comprehensions produce their items lazily
+expect_output("""
+    function naturals(){
+        i = 0;
+        while(True){
+            yield i;
+            i = i + 1;
+        }
+    }
+    function take(n, items){
+        if (n == 0){ return None; }
+        for(x in items){
+            yield x;
+            n = n - 1;
+            if (n == 0){ return None; }
+        }
+    }
+    function outer(){
+        inner = function(){ yield 1; };
+        return 5;
+    }
+    print([x for x in take(4, (x * x for x in naturals()))]);
+    g = take(3, naturals());
+    print(g.__next__());
+    print([x for x in g]);
+    print([x for x in g]);
+    print(outer());
+""", "[0, 1, 4, 9]\n0\n[1, 2]\n[]\n5")
+
+#dicts, with builtin keys and keys that define their own `__hash__` and `__eq__`
+expect_output("""
+    class Point{
+        function __init__(self, x, y){ self.x = x; self.y = y; }
+        function __hash__(self){ return self.x + self.y; }
+        function __eq__(self, other){ return self.x == other.x and self.y == other.y; }
+    }
+    d = {1: "one", "1": "string one"};
+    d[Point(1, 2)] = "p";
+    d[Point(2, 1)] = "q";
+    d[Point(1, 2)] = "r";
+    print([d[1], d["1"], d[Point(1, 2)], d[Point(2, 1)]]);
+    print([d.size(), d.contains(Point(3, 0)), d.get(Point(3, 0), 0)]);
+    d.delete(1);
+    d.delete(1);
+    print(d.keys().size());
+    print({"a": [1, 2], 3: {}});
+""", "[one, string one, r, q]\n[4, False, 0]\n3\n{a: [1, 2], 3: {}}")
+
+#Integers and Strings are shared, so they can't take attributes
+for code in ["x = 5; x.foo = 1;", 'x = "a"; x.foo = 1;', "x = 5; x.type = String;"]:
+    for engine in sorted(ks.engines):
+        try:
+            ks.execute(code, engine=engine)
+        except AssertionError as e:
+            assert str(e).startswith("can't set attributes of "), "unexpected error from {} on the {} engine: {}".format(repr(code), engine, repr(str(e)))
+        else:
+            assert False, "expected {} to fail on the {} engine".format(repr(code), engine)
+
+#only a type's parent changes which methods are inherited, so other objects can have a `parent` without invalidating the method tables
+version = ks.eval_ast.object_factory.method_table_version
+ks.execute("Node = Type(\"Node\", Object, []); leaf = Node(); leaf.parent = Node();")
+assert ks.eval_ast.object_factory.method_table_version != version
+version = ks.eval_ast.object_factory.method_table_version
+ks.execute("leaf.parent = Node();")
+assert ks.eval_ast.object_factory.method_table_version == version
+ks.execute("Node.parent = Object;")
+assert ks.eval_ast.object_factory.method_table_version != version
+
+#objects can still be used as the old nested public/private dicts
+from ks.eval_ast import object_factory
+obj = object_factory.make(100000)
+assert obj["private"]["value"] == 100000 and "items" not in obj["private"]
+assert obj["public"]["type"] is object_factory.builtins["Integer"]
+obj["public"]["frob"] = object_factory.make("frob")
+obj["private"]["note"] = "kept"
+assert object_factory.get_attribute(obj, "frob").value == "frob" and obj.data == {"note": "kept"}
+assert sorted(obj["public"].keys()) == ["frob", "type"]
+
+#slices of long strings are only copied when their value is read
+from ks.kobjects import SliceString, get_value_slot
+piece = object_factory.call_method(object_factory.make("x" * 1000), "slice", [object_factory.make(10)])
+assert isinstance(piece, SliceString) and get_value_slot(piece) is None
+assert object_factory.call_method(piece, "size", []).value == 990 and get_value_slot(piece) is None
+assert piece.value == "x" * 990 and get_value_slot(piece) == "x" * 990 and piece.source is None
+assert object_factory.call_method(piece, "size", []).value == 990
+
+#`find` positions are relative to the slice, even before its characters are copied
+digits = object_factory.call_method(object_factory.make("0123456789" * 100), "slice", [object_factory.make(95)])
+host_digits = ("0123456789" * 100)[95:]
+for start in [-10, -5, -2000, 0, 3, 2000]:
+    position = object_factory.call_method(digits, "find", [object_factory.make("0"), object_factory.make(start)]).value
+    assert position == host_digits.find("0", start), "expected find from {} to return {}, got {}".format(start, host_digits.find("0", start), position)
+assert get_value_slot(digits) is None
+
+#Strings can only be ordered against other Strings
+for engine in sorted(ks.engines):
+    try:
+        ks.execute('print("a" < 1);', engine=engine)
+    except AssertionError as e:
+        assert str(e) == "can't compare String with Integer", "unexpected error on the {} engine: {}".format(engine, repr(str(e)))
+    else:
+        assert False, "comparing a String with an Integer should fail on the {} engine".format(engine)
+
+#common Integers are shared, and literals are only converted once
+assert object_factory.make(-5) is object_factory.make(-5) and object_factory.make(1024) is object_factory.make(1024)
+assert object_factory.make(1025) is not object_factory.make(1025)
+expect_output("""
+    function big(){ return 100000; }
+    i = 0;
+    while(i < 3){ i = i + 1; }
+    print(big() + big() + i);
+""", "200003")
+
+#the optimizer collapses wrapper nodes, desugars, and folds constants, without changing what programs do
+from ks import optimizer
+optimized = optimizer.optimize(ks.compile('x = 2 * (3 + 4) - -1; y = "a" + "b"; z = [x][0];'))
+assignments = [statement.children[0] for statement in optimized.children]
+assert [assignment.children[1].children[0].token.value for assignment in assignments[:2]] == ["15", '"ab"']
+assert all(assignment.children[1].klass == "FoldedConstant" for assignment in assignments[:2])
+assert assignments[2].children[1].klass == "Call"
+expect_output("""
+    x = [1, 2 + 3];
+    x[0] = x[1] * (4 - 1) % 7;
+    print(x[0] + 10 / 3);
+    print("con" + "cat");
+""", "4\nconcat")
+
+#folded constants notice when their operators are overridden, even through an alias of `override_method`, or by an earlier program
+for engine in sorted(ks.engines):
+    first = ks.check_output("""
+        o = override_method;
+        print(1 + 2);
+        o(Integer, "__add__", function(a, b){ return 42; });
+        print(1 + 2);
+    """, engine=engine)
+    later = ks.check_output("print(1 + 2); x = 1; print(x + 2);", engine=engine)
+    integer_methods["__add__"] = original_add
+    ks.eval_ast.object_factory.invalidate_method_tables()
+    del ks.eval_ast.builtins["o"]
+    assert first == "3\n42" and later == "42\n42", "folded constants ignored an override on the {} engine, got {} and {}".format(engine, repr(first), repr(later))
+expect_output("print(1 + 2);", "3")
+
+#built-in types are only iterated over directly while their iteration methods are the native ones
+list_methods = ks.eval_ast.builtins["List"].data["instance_methods"]
+original_list_iter = list_methods["__iter__"]
+iterator_methods = ks.eval_ast.builtins["Iterator"].data["instance_methods"]
+original_iterator_next = iterator_methods["__next__"]
+for engine in sorted(ks.engines):
+    result = ks.check_output("""
+        for(x in [7, 8]){ print(x); }
+        override_method(List, "__iter__", function(self){ return range(2, 4).__iter__(); });
+        for(x in [7, 8]){ print(x); }
+        override_method(Iterator, "__next__", function(self){ return StopIteration; });
+        numbers = range(3).__iter__();
+        print([x for x in numbers]);
+    """, engine=engine)
+    list_methods["__iter__"] = original_list_iter
+    iterator_methods["__next__"] = original_iterator_next
+    ks.eval_ast.object_factory.invalidate_method_tables()
+    assert result == "7\n8\n2\n3\n[]", "overridden iteration methods were ignored on the {} engine, got {}".format(engine, repr(result))
+expect_output("for(x in [7, 8]){ print(x); }", "7\n8")
+
+#the vm engine runs KS calls in its own frames, so recursion isn't limited by python's recursion limit
+deep_recursion = """
+    function count(n){
+        if (n == 0){return 0;}
+        return count(n-1) + 1;
+    }
+    print(count(20000));
+"""
+assert ks.check_output(deep_recursion, engine="vm") == "20000"
+
+#calls in tail position reuse the caller's frame, including method calls
+tail_recursion = """
+    class Counter{
+        function down(self, n, acc){
+            if (n == 0){return acc;}
+            return self.down(n-1, acc+2);
+        }
+    }
+    function loop(n, acc){
+        if (n == 0){return acc;}
+        return loop(n-1, acc+1);
+    }
+    print(loop(50000, 0) + Counter().down(50000, 0));
+"""
+assert ks.check_output(tail_recursion, engine="vm") == "150000"
+
+#programs run from Python aren't written to the snapshot cache unless asked to be
+import tempfile
+cache_dir = tempfile.mkdtemp()
+old_cache_dir = os.environ.get("KS_CACHE_DIR")
+os.environ["KS_CACHE_DIR"] = cache_dir
+try:
+    ks.execute("x = 23;")
+    assert os.listdir(cache_dir) == []
+    ks.execute("x = 23;", cache=True)
+    assert len(os.listdir(cache_dir)) == 1
+finally:
+    if old_cache_dir is None:
+        del os.environ["KS_CACHE_DIR"]
+    else:
+        os.environ["KS_CACHE_DIR"] = old_cache_dir
+    shutil.rmtree(cache_dir)
+
+#the single pass compiler builds the same tree as the one that replays the derivation
+two_pass_compile = ast.get_compiler(
+    os.path.join(ks.cur_dir, "tokens.txt"),
+    os.path.join(ks.cur_dir, "language.txt"),
+    ks.reducible_nodes
+)
+for filename in [ks.prelude_filename, os.path.join(ks.top_dir, "samples", "prime_detector.k")]:
+    with open(filename) as file:
+        program_text = file.read()
+    assert repr(ks.base_compile(program_text)) == repr(two_pass_compile(program_text)), "single pass and two pass trees differ for {}".format(filename)
+
+#single pass compile time grows linearly with the length of a program, rather than quadratically with the length of its statement lists
+import gc
+import time
+def compile_time(statement_count):
+    program_text = "x = 1 + 2;\n" * statement_count
+    gc.disable()
+    try:
+        start = time.time()
+        ks.base_compile(program_text)
+        return time.time() - start
+    finally:
+        gc.enable()
+small_time, large_time = compile_time(4000), compile_time(32000)
+assert large_time < small_time * 14, "compiling 8 times as many statements took {:.1f} times as long".format(large_time / small_time)
+
+#the compiler and `util.is_valid` share the parser built for the grammar, instead of building or loading a table set each
+from ks.parser import tablecache, util
+with open(os.path.join(ks.cur_dir, "language.txt")) as file:
+    rules_text = file.read()
+assert tablecache.grammar_key(rules_text) in util._parsers
+parser_count = len(util._parsers)
+util.is_valid(rules_text, "")
+assert len(util._parsers) == parser_count
+
 #tests we'd like to pass for future versions
 #argument unpacking
 #expect_runs("function frob(*args){;}")
 #expect_runs("function frob(x, *args){;}")
+